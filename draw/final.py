@@ -1,7 +1,12 @@
 from time import time, sleep
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+import bpy
 import pyluxcore
 from .. import utils
 from ..export.aovs import get_denoiser_imgpipeline_props
+from ..handlers.draw_imageeditor import TileStats
 from ..properties.denoiser import LuxCoreDenoiser
 from ..properties.display import LuxCoreDisplaySettings
 from ..utils import view_layer as utils_view_layer
@@ -36,6 +41,36 @@ DEFAULT_AOV_SETTINGS = AOV(3, pyluxcore.ConvertFilmChannelOutput_3xFloat_To_3xFl
 
 AOVS_WITH_ID = {"RADIANCE_GROUP", "BY_MATERIAL_ID", "BY_OBJECT_ID", "MATERIAL_ID_MASK", "OBJECT_ID_MASK"}
 
+# Films with at least this many pixels are refreshed region by region if possible
+PARTIAL_REFRESH_MIN_PIXELS = 4096 * 4096
+# Edge length of the regions in pixels
+PARTIAL_REFRESH_REGION_SIZE = 256
+# If more regions than this fraction need a refresh, the whole film is refreshed at once
+PARTIAL_REFRESH_MAX_FRACTION = 0.5
+
+# Used to convert AOVs in parallel
+_aov_import_executor = None
+
+
+def _get_aov_import_executor():
+    global _aov_import_executor
+    if _aov_import_executor is None:
+        _aov_import_executor = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1),
+                                                  thread_name_prefix="BlendLuxCore_AOVImport")
+    return _aov_import_executor
+
+
+class AOVImportJob:
+    """ Everything needed to convert one film output into a Blender render pass """
+    def __init__(self, pass_name, convert_func, output_type, index, normalize, uses_imagepipeline):
+        self.pass_name = pass_name
+        self.convert_func = convert_func
+        self.output_type = output_type
+        self.index = index
+        self.normalize = normalize
+        # Jobs that execute an imagepipeline can't run in parallel, they share the film
+        self.uses_imagepipeline = uses_imagepipeline
+
 
 class FrameBufferFinal(object):
     """ FrameBuffer for final render """
@@ -59,62 +94,295 @@ class FrameBufferFinal(object):
         self.denoiser_last_elapsed_time = 0
         self.denoiser_last_samples = 0
 
-    def draw(self, engine, session, scene, render_stopped):
+        # The combined pass is written directly into the Blender pass. If that fails, it is
+        # copied through these buffers, which are allocated once and re-used on every refresh.
+        self._use_direct_combined = True
+        self._combined_buffer = None
+        self._rgb_buffer = None
+        # Peak memory used by the buffers above, in bytes
+        self.peak_buffer_bytes = 0
+
+        # List of AOVImportJobs for the enabled AOVs and light groups, built on the first refresh
+        self._import_plan = None
+
+        # Partial refresh of large films: the film is split into square regions of
+        # PARTIAL_REFRESH_REGION_SIZE pixels, addressed by (column, row)
+        self._use_partial_refresh = self._width * self._height >= PARTIAL_REFRESH_MIN_PIXELS
+        size = PARTIAL_REFRESH_REGION_SIZE
+        self._region_columns = (self._width + size - 1) // size
+        self._region_rows = (self._height + size - 1) // size
+        # Regions that changed since they were last written into the render result
+        self._stale_regions = set()
+        # Partial results can only be used if there are no other passes, because
+        # Blender would overwrite them with the empty passes of the partial result
+        self._result_pass_count = 0
+        # Pass counts of the tiles at the last refresh, {(x, y): passcount}
+        self._tile_passcounts = {}
+
+    def draw(self, engine, session, scene, render_stopped, allow_partial=False):
+        """
+        Refresh the render result. If allow_partial is True, only the regions of large films
+        that received new samples and are visible in an image editor may be written.
+        """
+        start = time()
         active_layer = utils_view_layer.State.active_view_layer
         scene_layer_name = scene.view_layers[active_layer].name if active_layer else ""
 
+        if self._use_partial_refresh and not engine.is_preview:
+            if allow_partial and not render_stopped and self._can_refresh_partially(session, scene):
+                self._update_stale_regions()
+                regions = self._get_regions_to_refresh()
+                if len(regions) <= PARTIAL_REFRESH_MAX_FRACTION * self._region_columns * self._region_rows:
+                    self._draw_regions(engine, session.GetFilm(), scene_layer_name, regions)
+                    self._stale_regions -= regions
+                    self._update_refresh_stats(engine, start)
+                    return
+
+            # The full refresh below writes all regions, later changes are counted from here
+            self._stale_regions.clear()
+            self._tile_passcounts = _get_tile_passcounts(self._width, self._height) or {}
+
         result = engine.begin_result(0, 0, self._width, self._height, layer=scene_layer_name)
         # Regardless of the scene render layers, the result always only contains one layer
         render_layer = result.layers[0]
+        self._result_pass_count = len(render_layer.passes)
 
         combined = render_layer.passes["Combined"]
-        film = session.GetFilm()
-        if self._combined_output_type == pyluxcore.FilmOutputType.RGB_IMAGEPIPELINE:
-            size = self._width * self._height
-            pixels = np.zeros([size, 3], dtype=np.float32)
-            film.GetOutputFloat(self._combined_output_type, pixels)
-            pixels = np.c_[pixels, np.ones(size)]
-            combined.rect = pixels
-        elif self._combined_output_type == pyluxcore.FilmOutputType.RGBA_IMAGEPIPELINE:
-            size = self._width * self._height
-            pixels = np.zeros([size, 4], dtype=np.float32)
-            film.GetOutputFloat(self._combined_output_type, pixels)
-            combined.rect = pixels
-        else:
-            raise ValueError(f"Unhandled Output Type {self._combined_output_type}")
+        self._import_combined(session.GetFilm(), combined)
 
         # Import AOVs only in final render, not in material preview mode
         if not engine.is_preview:
-            for output_name, output_type in pyluxcore.FilmOutputType.names.items():
-                # Check if this AOV is enabled on this render layer
-                scene_layer = scene.view_layers[active_layer]
-                if getattr(scene_layer.luxcore.aovs, output_name.lower(), False):
-                    try:
-                        self._import_aov(output_name, output_type, render_layer, session, engine)
-                    except RuntimeError as error:
-                        print("Error on import of AOV %s: %s" % (output_name, error))
-
-            lightgroup_pass_names = scene.luxcore.lightgroups.get_pass_names()
-            for i, name in enumerate(lightgroup_pass_names):
-                if i not in engine.exporter.lightgroup_cache:
-                    # This light group is not used by any lights in the scene, so it was not defined
-                    continue
+            if self._import_plan is None:
+                self._import_plan = self._build_import_plan(engine, scene.view_layers[active_layer], scene)
 
-                output_name = "RADIANCE_GROUP"
-                output_type = pyluxcore.FilmOutputType.RADIANCE_GROUP
-                try:
-                    self._import_aov(output_name, output_type, render_layer, session, engine, True, i, name)
-                except RuntimeError as error:
-                    print("Error on import of Lightgroup AOV of group %s: %s" % (name, error))
+            if render_stopped or LuxCoreDisplaySettings.refresh or session.IsInPause():
+                jobs = self._import_plan
+            else:
+                # While rendering, only update the passes someone is looking at
+                viewed_pass_names = _get_viewed_pass_names(render_layer)
+                jobs = [job for job in self._import_plan if job.pass_name in viewed_pass_names]
 
+            self._run_import_jobs(jobs, render_layer, session)
             self._refresh_denoiser(engine, session, scene, render_layer, render_stopped)
 
         engine.end_result(result)
         # Reset the refresh button
         LuxCoreDisplaySettings.refresh = False
+        self._update_refresh_stats(engine, start)
+
+    def _update_refresh_stats(self, engine, start):
+        stats = engine.exporter.stats if engine.exporter else None
+        if stats:
+            refresh_time = time() - start
+            stats.film_refresh_time.value = refresh_time
+            stats.film_refresh_time_max.value = max(stats.film_refresh_time_max.value, refresh_time)
+            stats.film_buffer_memory.value = self.peak_buffer_bytes
+
+    def _import_combined(self, film, combined):
+        if self._use_direct_combined:
+            try:
+                # Convert and copy the film output straight into the pass (for RGB, alpha is set to 1)
+                self._convert_combined(film, self._combined_output_type, 0, self._width, self._height,
+                                       combined.as_pointer(), False, True)
+                return
+            except RuntimeError as error:
+                print("Could not import combined pass directly, falling back to buffers:", error)
+                self._use_direct_combined = False
+
+        size = self._width * self._height
+        if self._combined_buffer is None:
+            self._combined_buffer = np.empty([size, 4], dtype=np.float32)
+            # The alpha channel never changes
+            self._combined_buffer[:, 3] = 1
+            self.peak_buffer_bytes += self._combined_buffer.nbytes
+        if self._rgb_buffer is None and self._combined_output_type == pyluxcore.FilmOutputType.RGB_IMAGEPIPELINE:
+            self._rgb_buffer = np.empty([size, 3], dtype=np.float32)
+            self.peak_buffer_bytes += self._rgb_buffer.nbytes
 
-    def _import_aov(self, output_name, output_type, render_layer, session, engine,
-                    execute_imagepipeline=True, index=0, lightgroup_name=""):
+        if self._combined_output_type == pyluxcore.FilmOutputType.RGB_IMAGEPIPELINE:
+            film.GetOutputFloat(self._combined_output_type, self._rgb_buffer)
+            self._combined_buffer[:, :3] = self._rgb_buffer
+        elif self._combined_output_type == pyluxcore.FilmOutputType.RGBA_IMAGEPIPELINE:
+            film.GetOutputFloat(self._combined_output_type, self._combined_buffer)
+        else:
+            raise ValueError(f"Unhandled Output Type {self._combined_output_type}")
+        combined.rect = self._combined_buffer
+
+    def _can_refresh_partially(self, session, scene):
+        if self._result_pass_count != 1 or LuxCoreDisplaySettings.refresh or session.IsInPause():
+            return False
+        # Automatic tonemappers change the brightness of the whole image with every pass
+        if scene.camera.data.luxcore.imagepipeline.tonemapper.is_automatic():
+            return False
+        # All passes except Combined are only imported during full refreshes
+        return not any(space.image_user.multilayer_pass != 0 for space, _ in _get_render_result_editors())
+
+    def _get_region_rect(self, column, row):
+        size = PARTIAL_REFRESH_REGION_SIZE
+        x = column * size
+        y = row * size
+        return x, y, min(size, self._width - x), min(size, self._height - y)
+
+    def _get_regions_in_rect(self, x, y, width, height):
+        """ Returns the regions that overlap the given rectangle (in pixels, both edges inclusive) """
+        size = PARTIAL_REFRESH_REGION_SIZE
+        first_column = max(0, int(x) // size)
+        first_row = max(0, int(y) // size)
+        last_column = min(self._region_columns - 1, int(math.ceil(x + width)) // size)
+        last_row = min(self._region_rows - 1, int(math.ceil(y + height)) // size)
+        return {(column, row) for column in range(first_column, last_column + 1)
+                for row in range(first_row, last_row + 1)}
+
+    def _update_stale_regions(self):
+        changed = self._find_changed_tile_regions()
+        if changed is None:
+            # No way to tell which pixels received new samples
+            changed = self._get_regions_in_rect(0, 0, self._width - 1, self._height - 1)
+        self._stale_regions |= changed
+
+    def _find_changed_tile_regions(self):
+        """ With the tile path engine, the pass counts of the tiles tell which parts of the film changed """
+        passcounts = _get_tile_passcounts(self._width, self._height)
+        if passcounts is None:
+            return None
+
+        tile_width, tile_height = TileStats.width, TileStats.height
+        changed = set()
+        # Tiles that are currently rendered receive new samples all the time
+        pending_coords = TileStats.pending_coords
+        for i in range(len(pending_coords) // 2):
+            changed |= self._get_regions_in_rect(pending_coords[i * 2], pending_coords[i * 2 + 1],
+                                                 tile_width - 1, tile_height - 1)
+
+        for (x, y), passcount in passcounts.items():
+            if self._tile_passcounts.get((x, y)) != passcount:
+                changed |= self._get_regions_in_rect(x, y, tile_width - 1, tile_height - 1)
+
+        self._tile_passcounts = passcounts
+        return changed
+
+    def _get_regions_to_refresh(self):
+        if self._border != [0, 1, 0, 1]:
+            # The film only covers a part of the image shown in the image editor
+            return set(self._stale_regions)
+
+        visible_regions = set()
+        for space, window_region in _get_render_result_editors():
+            if window_region is None:
+                return set(self._stale_regions)
+            # View coordinates are relative to the image size (0..1)
+            min_x, min_y = window_region.view2d.region_to_view(0, 0)
+            max_x, max_y = window_region.view2d.region_to_view(window_region.width, window_region.height)
+            min_x = max(min_x, 0) * self._width
+            min_y = max(min_y, 0) * self._height
+            max_x = min(max_x, 1) * self._width
+            max_y = min(max_y, 1) * self._height
+            if max_x > min_x and max_y > min_y:
+                visible_regions |= self._get_regions_in_rect(min_x, min_y, max_x - min_x, max_y - min_y)
+
+        if not visible_regions:
+            # Nothing visible or no image editor (e.g. render in a new window that is minimized)
+            return set(self._stale_regions)
+        return self._stale_regions & visible_regions
+
+    def _draw_regions(self, engine, film, layer_name, regions):
+        """ Write the combined pass of the given regions into the render result, one row of regions at a time """
+        combined = self._read_combined_output(film)
+        channels = combined.shape[2]
+
+        for x, y, width, height in self._merge_regions(regions):
+            result = engine.begin_result(x, y, width, height, layer=layer_name)
+            pixels = np.empty((height, width, 4), dtype=np.float32)
+            pixels[..., :channels] = combined[y:y + height, x:x + width]
+            if channels == 3:
+                pixels[..., 3] = 1
+            result.layers[0].passes["Combined"].rect = pixels.reshape(-1, 4)
+            engine.end_result(result)
+
+    def _merge_regions(self, regions):
+        """ Merge horizontally adjacent regions into rectangles (x, y, width, height) """
+        rects = []
+        for row in range(self._region_rows):
+            columns = sorted(column for column, region_row in regions if region_row == row)
+            run_start = None
+            for i, column in enumerate(columns):
+                if run_start is None:
+                    run_start = column
+                if i + 1 == len(columns) or columns[i + 1] != column + 1:
+                    x, y, _, height = self._get_region_rect(run_start, row)
+                    last_x, _, last_width, _ = self._get_region_rect(column, row)
+                    rects.append((x, y, last_x + last_width - x, height))
+                    run_start = None
+        return rects
+
+    def _read_combined_output(self, film):
+        """ Read the combined output into a persistent H x W x C buffer """
+        size = self._width * self._height
+        if self._combined_output_type == pyluxcore.FilmOutputType.RGB_IMAGEPIPELINE:
+            if self._rgb_buffer is None:
+                self._rgb_buffer = np.empty([size, 3], dtype=np.float32)
+                self.peak_buffer_bytes += self._rgb_buffer.nbytes
+            buffer = self._rgb_buffer
+        else:
+            if self._combined_buffer is None:
+                self._combined_buffer = np.empty([size, 4], dtype=np.float32)
+                self.peak_buffer_bytes += self._combined_buffer.nbytes
+            buffer = self._combined_buffer
+
+        film.GetOutputFloat(self._combined_output_type, buffer)
+        return buffer.reshape(self._height, self._width, -1)
+
+    def _build_import_plan(self, engine, scene_layer, scene):
+        plan = []
+
+        for output_name, output_type in pyluxcore.FilmOutputType.names.items():
+            # Check if this AOV is enabled on this render layer
+            if getattr(scene_layer.luxcore.aovs, output_name.lower(), False):
+                plan.append(self._make_import_job(output_name, output_type, engine))
+
+        lightgroup_pass_names = scene.luxcore.lightgroups.get_pass_names()
+        for i, name in enumerate(lightgroup_pass_names):
+            if i not in engine.exporter.lightgroup_cache:
+                # This light group is not used by any lights in the scene, so it was not defined
+                continue
+
+            output_type = pyluxcore.FilmOutputType.RADIANCE_GROUP
+            plan.append(self._make_import_job("RADIANCE_GROUP", output_type, engine, i, name))
+
+        return plan
+
+    def _run_import_jobs(self, jobs, render_layer, session):
+        film = session.GetFilm()
+        # Look up the passes here, Blender data must not be accessed from the worker threads
+        pointers = [render_layer.passes[job.pass_name].as_pointer() for job in jobs]
+        parallel_jobs = []
+
+        for job, pass_pointer in zip(jobs, pointers):
+            if job.uses_imagepipeline:
+                self._run_import_job(job, film, pass_pointer)
+            else:
+                parallel_jobs.append((job, pass_pointer))
+
+        if len(parallel_jobs) > 1:
+            executor = _get_aov_import_executor()
+            futures = [executor.submit(self._run_import_job, job, film, pass_pointer)
+                       for job, pass_pointer in parallel_jobs]
+            for future in futures:
+                future.result()
+        elif parallel_jobs:
+            job, pass_pointer = parallel_jobs[0]
+            self._run_import_job(job, film, pass_pointer)
+
+    def _run_import_job(self, job, film, pass_pointer, execute_imagepipeline=True):
+        try:
+            # Convert and copy the buffer into the blender_pass.rect
+            job.convert_func(film, job.output_type, job.index,
+                             self._width, self._height, pass_pointer,
+                             job.normalize, execute_imagepipeline)
+        except RuntimeError as error:
+            print("Error on import of AOV %s: %s" % (job.pass_name, error))
+
+    def _make_import_job(self, output_name, output_type, engine, index=0, lightgroup_name=""):
         if output_name in AOVS:
             aov = AOVS[output_name]
         else:
@@ -133,8 +401,10 @@ class FrameBufferFinal(object):
                 output_type = pyluxcore.FilmOutputType.RGB_IMAGEPIPELINE
 
             convert_func = DEFAULT_AOV_SETTINGS.convert_func
+            uses_imagepipeline = True
         else:
             convert_func = aov.convert_func
+            uses_imagepipeline = False
 
         # Depth needs special treatment because it's pre-defined by Blender and not uppercase
         if output_name == "DEPTH":
@@ -144,12 +414,17 @@ class FrameBufferFinal(object):
         else:
             pass_name = output_name
 
-        blender_pass = render_layer.passes[pass_name]
+        return AOVImportJob(pass_name, convert_func, output_type, index, aov.normalize, uses_imagepipeline)
+
+    def _import_aov(self, output_name, output_type, render_layer, session, engine,
+                    execute_imagepipeline=True, index=0, lightgroup_name=""):
+        job = self._make_import_job(output_name, output_type, engine, index, lightgroup_name)
+        blender_pass = render_layer.passes[job.pass_name]
 
         # Convert and copy the buffer into the blender_pass.rect
-        convert_func(session.GetFilm(), output_type, index,
-                     self._width, self._height, blender_pass.as_pointer(),
-                     aov.normalize, execute_imagepipeline)
+        job.convert_func(session.GetFilm(), job.output_type, job.index,
+                         self._width, self._height, blender_pass.as_pointer(),
+                         job.normalize, execute_imagepipeline)
 
     def _refresh_denoiser(self, engine, session, scene, render_layer, render_stopped):
         if not engine.has_denoiser():
@@ -222,3 +497,50 @@ class FrameBufferFinal(object):
             # So we re-use the result from the last denoiser run.
             self._import_aov(output_name, output_type, render_layer, session, engine,
                              execute_imagepipeline=False)
+
+
+def _get_tile_passcounts(film_width, film_height):
+    """ Returns {(x, y): passcount} of the finished tiles of the tile path engine, or None if there are no tiles """
+    if (getattr(TileStats, "width", 0) == 0 or TileStats.height == 0
+            or (TileStats.film_width, TileStats.film_height) != (film_width, film_height)):
+        return None
+
+    passcounts = {}
+    for coords, counts in ((TileStats.converged_coords, TileStats.converged_passcounts),
+                           (TileStats.notconverged_coords, TileStats.notconverged_passcounts)):
+        for i in range(len(coords) // 2):
+            passcounts[(coords[i * 2], coords[i * 2 + 1])] = counts[i] if i < len(counts) else -1
+    return passcounts
+
+
+def _get_render_result_editors():
+    """ Returns (space, window region) of all image editors that show the render result """
+    editors = []
+
+    try:
+        for window in bpy.context.window_manager.windows:
+            for area in window.screen.areas:
+                if area.type != "IMAGE_EDITOR":
+                    continue
+                space = area.spaces.active
+                if space.image and space.image.type == "RENDER_RESULT":
+                    window_region = next((region for region in area.regions if region.type == "WINDOW"), None)
+                    editors.append((space, window_region))
+    except (AttributeError, ReferenceError):
+        # UI not available (e.g. command line render)
+        pass
+
+    return editors
+
+
+def _get_viewed_pass_names(render_layer):
+    """ Returns the names of the render result passes currently shown in image editors """
+    pass_names = set()
+    passes = render_layer.passes
+
+    for space, _ in _get_render_result_editors():
+        pass_index = space.image_user.multilayer_pass
+        if 0 <= pass_index < len(passes):
+            pass_names.add(passes[pass_index].name)
+
+    return pass_names
@@ -4,6 +4,7 @@ from gpu_extras.batch import batch_for_shader
 
 import math
 import os
+from time import time
 import numpy as np
 import subprocess
 import tempfile
@@ -13,6 +14,22 @@ import pyluxcore
 from .. import utils
 from ..utils import pfm
 
+# Minimum render time in seconds between two progressive denoiser runs
+DENOISER_MIN_INTERVAL = 0.5
+# The render time between two progressive denoiser runs is at least this factor
+# times the duration of the last denoiser run, so slow denoising does not stall the render
+DENOISER_BACKOFF_FACTOR = 2
+# Seconds a denoised result stays on screen while the render continues, afterwards
+# the live film is shown again until the next denoiser run is done
+DENOISED_RESULT_MAX_AGE = 2
+
+def _get_denoiser_temp_dir():
+    # Prefer a RAM-backed filesystem, so the denoiser files never have to be written to disk
+    shm_path = "/dev/shm"
+    if os.path.isdir(shm_path) and os.access(shm_path, os.W_OK):
+        return shm_path
+    return tempfile.gettempdir()
+
 # Add the TempfileManager class here
 
 class TempfileManager:
@@ -26,13 +43,24 @@ class TempfileManager:
         else:
             cls._paths[key].add(path)
 
+    @classmethod
+    def delete_file(cls, key, path):
+        if os.path.exists(path):
+            os.remove(path)
+        if key in cls._paths:
+            cls._paths[key].discard(path)
+
     @classmethod
     def delete_files(cls, key):
         if not key in cls._paths:
             return
         for path in cls._paths[key]:
             if os.path.exists(path):
-                os.remove(path)
+                try:
+                    os.remove(path)
+                except OSError as error:
+                    # Can happen on Windows if the file is still memory mapped
+                    print("Could not delete temporary file:", error)
         del cls._paths[key]
 
     @classmethod
@@ -67,12 +95,29 @@ class FrameBuffer(object):
         )
 
         self.buffer = gpu.types.Buffer('FLOAT', [self._width * self._height * bufferdepth])
+        # The texture is only re-created when the buffer contains new pixels, so
+        # redraws without new samples (e.g. when the UI is redrawn) don't upload the image again
+        self._texture = None
+        self._texture_dirty = True
         self._init_opengl()
 
         # Denoiser initialization
         self._initialize_denoiser_paths()
         TempfileManager._denoiser_process = None
         self.denoiser_result_cached = False
+        # True while the buffer contains the denoised result instead of the live film
+        self._shows_denoiser_result = False
+        # Memory mapped denoiser input files and alpha buffer, allocated on first use
+        # and re-used for every denoiser run of this framebuffer
+        self._denoiser_aovs = None
+        self._alpha = None
+        # Progressive denoising state, see schedule_denoiser()
+        self._denoiser_job_samples = 0
+        self._denoiser_start_time = 0
+        self._denoiser_end_time = 0
+        self._denoiser_interval = DENOISER_MIN_INTERVAL
+        self._next_denoiser_samples = 1
+        self.denoised_samples = 0
 
     def _initialize_transparency(self, scene, context):
         if utils.is_valid_camera(scene.camera) and not utils.in_material_shading_mode(context):
@@ -80,7 +125,7 @@ class FrameBuffer(object):
         return False
 
     def _initialize_denoiser_paths(self):
-        base_path = tempfile.gettempdir()
+        base_path = _get_denoiser_temp_dir()
         unique_id = id(self)
         self._noisy_file_path = os.path.join(base_path, f"{unique_id}_noisy.pfm")
         self._albedo_file_path = os.path.join(base_path, f"{unique_id}_albedo.pfm")
@@ -106,7 +151,11 @@ class FrameBuffer(object):
         )
 
     def __del__(self):
+        self._texture = None
         del self.buffer
+        # The memory maps have to be closed before the files can be deleted (on Windows)
+        self._denoiser_aovs = None
+        TempfileManager.delete_files(id(self))
 
     def needs_replacement(self, context, scene):
         if (self._width, self._height) != utils.calc_filmsize(scene, context):
@@ -167,25 +216,40 @@ class FrameBuffer(object):
     def _cam_border_offset(self, aspect, base, border_min, region_width, view_camera_offset, zoom):
         return (0.5 - 2 * zoom * view_camera_offset) * region_width + aspect * base * (2 * border_min - 1)
 
-    def _save_denoiser_AOV(self, luxcore_session, film_output_type, path):
-        np_buffer = np.zeros((self._height, self._width, 3), dtype="float32")
-        luxcore_session.GetFilm().GetOutputFloat(film_output_type, np_buffer)
-        TempfileManager.track(id(self), path)
-        with open(path, "wb") as f:
-            pfm.save_pfm(f, np_buffer)
-
-    def start_denoiser(self, luxcore_session):
+    def _get_denoiser_aovs(self):
+        """ Returns a dict {film output type: memory mapped PFM file} of the denoiser inputs """
+        if self._denoiser_aovs is None:
+            aov_paths = {
+                pyluxcore.FilmOutputType.RGB_IMAGEPIPELINE: self._noisy_file_path,
+                pyluxcore.FilmOutputType.ALBEDO: self._albedo_file_path,
+                pyluxcore.FilmOutputType.AVG_SHADING_NORMAL: self._normal_file_path,
+            }
+            self._denoiser_aovs = {}
+            for film_output_type, path in aov_paths.items():
+                TempfileManager.track(id(self), path)
+                self._denoiser_aovs[film_output_type] = pfm.create_pfm(path, self._width, self._height, 3)
+        return self._denoiser_aovs
+
+    def start_denoiser(self, luxcore_session, samples=0):
         if not os.path.exists(self._denoiser_path):
             raise Exception("Binary not found. Download it from https://github.com/OpenImageDenoise/oidn/releases")
 
+        # The film outputs are written straight into the memory mapped files
+        outputs = list(self._get_denoiser_aovs().items())
         if self._transparent:
-            self._alpha = np.zeros((self._height, self._width, 1), dtype="float32")
-            luxcore_session.GetFilm().GetOutputFloat(pyluxcore.FilmOutputType.ALPHA, self._alpha)
+            if self._alpha is None:
+                self._alpha = np.empty((self._height, self._width, 1), dtype="float32")
+            outputs.append((pyluxcore.FilmOutputType.ALPHA, self._alpha))
+
+        film = luxcore_session.GetFilm()
+        for film_output_type, buffer in outputs:
+            film.GetOutputFloat(film_output_type, buffer)
+        for buffer in self._denoiser_aovs.values():
+            buffer.flush()
 
-        self._save_denoiser_AOV(luxcore_session, pyluxcore.FilmOutputType.RGB_IMAGEPIPELINE, self._noisy_file_path)
-        self._save_denoiser_AOV(luxcore_session, pyluxcore.FilmOutputType.ALBEDO, self._albedo_file_path)
-        self._save_denoiser_AOV(luxcore_session, pyluxcore.FilmOutputType.AVG_SHADING_NORMAL, self._normal_file_path)
         TempfileManager.track(id(self), self._denoised_file_path)
+        self._denoiser_job_samples = samples
+        self._denoiser_start_time = time()
 
         print(f"Starting '{self._denoiser_path}'...")
         args = [
@@ -216,40 +280,90 @@ class FrameBuffer(object):
                     print(line, end='')
         print("Denoiser return code:", TempfileManager._denoiser_process.returncode)
         TempfileManager._denoiser_process = None
-        shape = (self._height * self._width * 3)
         try:
-            with open(self._denoised_file_path, "rb") as f:
-                data, scale = pfm.load_pfm(f)
-            TempfileManager.delete_files(id(self))
+            data, scale = pfm.open_pfm(self._denoised_file_path)
         except FileNotFoundError:
-            TempfileManager.delete_files(id(self))
             raise Exception("Denoising failed, check console for details")
 
-        if self._transparent:
-            shape = (self._height * self._width * 4)
-            data = np.concatenate((data, self._alpha), axis=2)
+        try:
+            if data.shape != (self._height, self._width, 3):
+                raise Exception("Denoiser result has wrong size %s" % (data.shape,))
+
+            if self._transparent:
+                # Interleave the denoised RGB with the alpha channel in a single pass
+                result = np.empty((self._height, self._width, 4), dtype=np.float32)
+                result[..., :3] = data
+                result[..., 3:] = self._alpha
+                self.buffer[:] = result.reshape(-1)
+            else:
+                # Copied directly from the memory mapped file
+                self.buffer[:] = data.reshape(-1)
+            self._texture_dirty = True
+        finally:
+            # The memory map has to be closed before the file can be deleted (on Windows).
+            # The denoiser input files are kept for the next run.
+            del data
+            TempfileManager.delete_file(id(self), self._denoised_file_path)
 
-        data = np.resize(data, shape)
-        self.buffer[:] = data
         self.denoiser_result_cached = True
+        self._shows_denoiser_result = True
+        self.denoised_samples = self._denoiser_job_samples
+        self._denoiser_end_time = time()
+        # Back off if denoising takes longer than rendering between runs
+        duration = self._denoiser_end_time - self._denoiser_start_time
+        self._denoiser_interval = max(DENOISER_MIN_INTERVAL, duration * DENOISER_BACKOFF_FACTOR)
+
+    def is_denoiser_result_current(self, samples):
+        return self._shows_denoiser_result and self.denoised_samples >= samples
+
+    def schedule_denoiser(self, luxcore_session, scene, samples):
+        """
+        Progressive denoising while the viewport render is running: OIDN is started in the background
+        at doubling sample counts (starting at the min. samples setting), and the latest completed
+        result is shown until the next one is done, or at most DENOISED_RESULT_MAX_AGE seconds.
+        """
+        if self.is_denoiser_active():
+            if self.is_denoiser_done():
+                self.load_denoiser_result(scene)
+            return
+
+        next_samples = max(self._next_denoiser_samples, scene.luxcore.viewport.min_samples)
+        if samples < next_samples or time() - self._denoiser_end_time < self._denoiser_interval:
+            return
+
+        self.start_denoiser(luxcore_session, samples)
+        self._next_denoiser_samples = samples * 2
 
     def reset_denoiser(self):
         """ Denoiser was not started yet or the user has triggered an update """
         self.denoiser_result_cached = False
+        self._shows_denoiser_result = False
+        self.denoised_samples = 0
+        self._next_denoiser_samples = 1
+        self._denoiser_interval = DENOISER_MIN_INTERVAL
+        self._denoiser_end_time = 0
 
         if TempfileManager._denoiser_process:
             print("Interrupting denoiser")
             TempfileManager._denoiser_process.terminate()
             print("Denoiser outputs: ", TempfileManager._denoiser_process.stdout)
             TempfileManager._denoiser_process = None
-            TempfileManager.delete_files(id(self))
+            TempfileManager.delete_file(id(self), self._denoised_file_path)
 
     def update(self, luxcore_session, scene):
+        if self._shows_denoiser_result and time() - self._denoiser_end_time < DENOISED_RESULT_MAX_AGE:
+            # Keep the latest denoised result on screen for a moment, the next one might be done soon
+            return
         luxcore_session.GetFilm().GetOutputFloat(self._output_type, self.buffer)
+        self._shows_denoiser_result = False
+        self._texture_dirty = True
 
     def draw(self, engine, context, scene):
-        format = 'RGBA16F' if self._transparent else 'RGB16F'
-        image = gpu.types.GPUTexture(size=(self._width, self._height), layers=0, is_cubemap=False, format=format,
-                                     data=self.buffer)
-        self.shader.uniform_sampler("image", image)
+        if self._texture is None or self._texture_dirty:
+            # The Python API can't update the pixels of an existing texture, so it is re-created
+            format = 'RGBA16F' if self._transparent else 'RGB16F'
+            self._texture = gpu.types.GPUTexture(size=(self._width, self._height), layers=0, is_cubemap=False,
+                                                 format=format, data=self.buffer)
+            self._texture_dirty = False
+        self.shader.uniform_sampler("image", self._texture)
         self.batch.draw(self.shader)
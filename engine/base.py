@@ -55,6 +55,8 @@ class LuxCoreRenderEngine(bpy.types.RenderEngine):
         self.aov_imagepipelines = {}
         self.is_first_viewport_start = True
         self.viewport_start_time = 0
+        # Time of the last scene edit or view change in the viewport
+        self.viewport_last_edit_time = 0
         self.starting_session = False
         self.viewport_starting_message_shown = False
         self.viewport_fatal_error = None
@@ -1,6 +1,7 @@
 from time import time, sleep
 from .. import export, utils
 from ..draw.final import FrameBufferFinal
+from .viewport import KernelCacheStatus
 from ..utils import render as utils_render
 from ..utils.errorlog import LuxCoreErrorLog
 from ..utils import view_layer as utils_view_layer
@@ -8,6 +9,56 @@ from ..properties.denoiser import LuxCoreDenoiser
 from ..properties.display import LuxCoreDisplaySettings
 
 
+class PersistentAnimationSession:
+    """
+    Keeps the exporter and the LuxCore session alive between the frames of an animation
+    render. Each new frame is then only a scene edit with the changes of this frame
+    instead of a full export, session start and kernel compilation.
+    """
+    exporter = None
+    session = None
+    layer_name = None
+
+    @staticmethod
+    def is_requested(engine, scene):
+        config = scene.luxcore.config
+        enabled_layers = [layer for layer in scene.view_layers if layer.use]
+        # We can only keep one session around, so this does not work with multiple render layers
+        return (engine.is_animation and config.use_persistent_animation_session
+                and not config.use_filesaver and len(enabled_layers) == 1)
+
+    @classmethod
+    def take(cls, view_layer):
+        """ Hand the stored exporter and session over to the caller (None if there are none) """
+        if cls.session is None or cls.layer_name != view_layer.name:
+            cls.stop()
+            return None, None
+
+        exporter, session = cls.exporter, cls.session
+        cls.exporter = None
+        cls.session = None
+        cls.layer_name = None
+        return exporter, session
+
+    @classmethod
+    def keep(cls, exporter, session, view_layer):
+        cls.stop()
+        cls.exporter = exporter
+        cls.session = session
+        cls.layer_name = view_layer.name
+
+    @classmethod
+    def stop(cls):
+        if cls.session is not None:
+            print("[Engine/Final] Stopping persistent animation session")
+            if cls.session.IsInPause():
+                cls.session.Resume()
+            cls.session.Stop()
+        cls.exporter = None
+        cls.session = None
+        cls.layer_name = None
+
+
 def render(engine, depsgraph):
     print("=" * 50)
     scene = depsgraph.scene_eval
@@ -53,9 +104,27 @@ def render(engine, depsgraph):
 
 def _render_layer(engine, depsgraph, statistics, view_layer):
     engine.reset()
-    engine.exporter = export.Exporter(statistics)
-    engine.session = engine.exporter.create_session(depsgraph, engine=engine, view_layer=view_layer)
     scene = depsgraph.scene_eval
+    keep_session = PersistentAnimationSession.is_requested(engine, scene)
+    session_reused = False
+
+    if keep_session:
+        engine.exporter, engine.session = PersistentAnimationSession.take(view_layer)
+
+        if engine.session is not None:
+            engine.exporter.stats = statistics
+            session_reused = engine.exporter.update_animation_frame(depsgraph, engine.session, engine)
+
+            if not session_reused:
+                print("[Engine/Final] Changes in this frame require a full export")
+                engine.session.Stop()
+                engine.session = None
+    else:
+        PersistentAnimationSession.stop()
+
+    if not session_reused:
+        engine.exporter = export.Exporter(statistics, is_animation_session=keep_session)
+        engine.session = engine.exporter.create_session(depsgraph, engine=engine, view_layer=view_layer)
 
     if engine.session is None:
         # session is None, but no error was thrown
@@ -64,12 +133,17 @@ def _render_layer(engine, depsgraph, statistics, view_layer):
 
     engine.framebuffer = FrameBufferFinal(scene)
 
-    # Create session
-    start = time()
-    engine.session.Start()
-    session_init_time = time() - start
-    print("Session started in %.1f s" % session_init_time)
-    statistics.session_init_time.value = session_init_time
+    if session_reused:
+        statistics.session_init_time.value = 0
+    else:
+        # Create session
+        start = time()
+        engine.session.Start()
+        session_init_time = time() - start
+        print("Session started in %.1f s" % session_init_time)
+        # GPU kernels might have been compiled during the start
+        KernelCacheStatus.clear()
+        statistics.session_init_time.value = session_init_time
 
     config = engine.session.GetRenderConfig()
 
@@ -87,10 +161,11 @@ def _render_layer(engine, depsgraph, statistics, view_layer):
         engine.session = None
         return
 
-    start = time()
+    display = depsgraph.scene.luxcore.display
+    fast_refresh_duration = 1 if engine.is_animation else 5
+    scheduler = utils_render.RefreshScheduler(time(), display.refresh_overhead / 100,
+                                              display.interval, fast_refresh_duration)
     path_settings = scene.luxcore.config.path
-    last_film_refresh = 0
-    last_stat_refresh = 0
     checked_optimal_clamp = path_settings.use_clamping
     engine_type = config.GetProperties().Get("renderengine.type").GetString()
     if engine_type.startswith("TILE"):
@@ -100,14 +175,15 @@ def _render_layer(engine, depsgraph, statistics, view_layer):
     else:
         clamp_warmup_samples = 2.0
     stats = utils_render.update_stats(engine.session)
-    FAST_REFRESH_DURATION = 1 if engine.is_animation else 5
 
     while True:
         now = time()
         manual_refresh_requested = LuxCoreDisplaySettings.refresh or LuxCoreDenoiser.refresh
-        update_stats = (now - last_stat_refresh) > _stat_refresh_interval(start, scene)
-        time_until_film_refresh = depsgraph.scene.luxcore.display.interval - (now - last_film_refresh)
-        fast_refresh = now - start < FAST_REFRESH_DURATION
+        # The settings can be changed by the user during the render
+        scheduler.film_interval = display.interval
+        scheduler.overhead_fraction = display.refresh_overhead / 100
+        update_stats = scheduler.is_stat_refresh_due(now)
+        time_until_film_refresh = scheduler.time_until_film_refresh(now)
 
         if LuxCoreDisplaySettings.paused:
             if not engine.session.IsInPause():
@@ -127,15 +203,18 @@ def _render_layer(engine, depsgraph, statistics, view_layer):
             if changes or manual_refresh_requested:
                 engine.framebuffer.draw(engine, engine.session, depsgraph.scene, render_stopped=False)
         else:
-            if fast_refresh or update_stats or changes or manual_refresh_requested or (time_until_film_refresh <= 0):
+            if update_stats or changes or manual_refresh_requested or (time_until_film_refresh <= 0):
                 # We have to check the stats often to see if a halt condition is met
                 # But film drawing is expensive, so we don't do it every time we check stats
-                draw_film = fast_refresh or (time_until_film_refresh <= 0)
+                draw_film = time_until_film_refresh <= 0
 
-                # Refresh quickly when user changed something or requested a refresh via button
+                # Refresh immediately when user changed something or requested a refresh via button,
+                # regardless of the refresh cost
                 draw_film |= changes or manual_refresh_requested
 
+                stats_start = time()
                 stats = utils_render.update_stats(engine.session)
+                scheduler.stats_refreshed(now, time() - stats_start)
                 if draw_film:
                     time_until_film_refresh = 0
                 utils_render.update_status_msg(stats, engine, depsgraph.scene, config, time_until_film_refresh)
@@ -144,11 +223,16 @@ def _render_layer(engine, depsgraph, statistics, view_layer):
                 if _stop_requested(engine) or engine.session.HasDone():
                     break
 
-                last_stat_refresh = now
                 if draw_film:
                     # Show updated film (this operation is expensive)
-                    engine.framebuffer.draw(engine, engine.session, depsgraph.scene, render_stopped=False)
-                    last_film_refresh = now
+                    draw_start = time()
+                    # After changes or a refresh request the whole film is refreshed, otherwise
+                    # large films only update the regions that received new samples
+                    engine.framebuffer.draw(engine, engine.session, depsgraph.scene, render_stopped=False,
+                                            allow_partial=not (changes or manual_refresh_requested))
+                    scheduler.film_refreshed(now, time() - draw_start)
+                    time_until_film_refresh = scheduler.time_until_film_refresh(time())
+                    statistics.refresh_overhead.value = scheduler.get_overhead(time())
 
             utils_render.update_status_msg(stats, engine, depsgraph.scene, config, time_until_film_refresh)
 
@@ -167,7 +251,7 @@ def _render_layer(engine, depsgraph, statistics, view_layer):
         # Don't use up too much CPU time for this refresh loop, but stay responsive
         # Note: The engine Python code seems to be threaded by Blender,
         # so the interface would not even hang if we slept for minutes here
-        sleep(1 / 5)
+        sleep(scheduler.sleep_duration(time()))
 
         # Check after we slept, before the next possible expensive operation
         if _stop_requested(engine):
@@ -178,6 +262,17 @@ def _render_layer(engine, depsgraph, statistics, view_layer):
     stats = utils_render.update_stats(engine.session)
     utils_render.update_status_msg(stats, engine, depsgraph.scene, config, time_until_film_refresh=0)
     engine.framebuffer.draw(engine, engine.session, depsgraph.scene, render_stopped=True)
+
+    is_last_frame = scene.frame_current + scene.frame_step > scene.frame_end
+    if keep_session and not is_last_frame and not _stop_requested(engine):
+        # Keep the session for the next frame, it is resumed after the scene was updated
+        if not engine.session.IsInPause():
+            engine.session.Pause()
+        PersistentAnimationSession.keep(engine.exporter, engine.session, view_layer)
+        # The session is now owned by PersistentAnimationSession, it must not be stopped in engine.__del__()
+        engine.session = None
+        return
+
     engine.update_stats("Render", "Stopping session...")
     if engine.session.IsInPause():
         engine.session.Resume()
@@ -191,19 +286,6 @@ def _stop_requested(engine):
     return engine.test_break() or LuxCoreDisplaySettings.stop_requested
 
 
-def _stat_refresh_interval(start, scene):
-    width, height = utils_render.calc_filmsize(scene)
-    is_big_image = width * height > 2000 * 2000
-    minimum = 4 if is_big_image else 1
-    maximum = 16
-
-    minutes = (time() - start) / 60
-    if minutes < 4:
-        return max(2**minutes, minimum)
-    else:
-        return maximum
-
-
 def _check_halt_conditions(engine, scene):
     enabled_layers = [layer for layer in scene.view_layers if layer.use]
     needs_halt_condition = len(enabled_layers) > 1 or engine.is_animation
@@ -10,11 +10,71 @@ from ..utils.log import LuxCoreLog
 from ..utils.errorlog import LuxCoreErrorLog
 from ..export.config import convert_viewport_engine
 
+# Seconds without changes in the viewport after which hair systems exported with
+# a reduced strand count (viewport level of detail) are replaced by the full ones
+HAIR_REFINE_DELAY = 1.5
+
+class KernelCacheStatus:
+    """
+    This class is a singleton.
+    Remembers whether the GPU kernels for a device selection and engine configuration are
+    already compiled, so the viewport does not have to build a dummy render config on every
+    redraw while the session is starting. The check itself runs in a separate thread.
+    """
+    # {(definitions, LuxCore version): True/False}
+    results = {}
+    # Keys of the checks that are currently running or that failed
+    pending = set()
+    # Incremented by clear(), results of checks that were started before are dropped
+    generation = 0
+
+    @classmethod
+    def has_cached_kernels(cls, luxcore_engine, definitions):
+        """ Returns True/False, or None if the status is not known yet (it is then checked in the background) """
+        key = (luxcore_engine, tuple(sorted(definitions.items())), pyluxcore.Version())
+        result = cls.results.get(key)
+
+        if result is None and key not in cls.pending:
+            cls.pending.add(key)
+            import _thread
+            _thread.start_new_thread(cls._check, (key, definitions, cls.generation))
+        return result
+
+    @classmethod
+    def _check(cls, key, definitions, generation):
+        # Executed in separate thread
+        try:
+            # Create dummy renderconfig to check if we have to compile OpenCL kernels
+            luxcore_scene = pyluxcore.Scene()
+            luxcore_scene.Parse(utils.create_props("", {"scene.camera.type": "perspective"}))
+            renderconfig = pyluxcore.RenderConfig(utils.create_props("", definitions), luxcore_scene)
+            result = renderconfig.HasCachedKernels()
+        except Exception as error:
+            # The key stays pending, so the error is logged once and not checked again on every redraw.
+            # Nothing is stored, the session start will report the device error.
+            print("[Engine/Viewport] Could not check the kernel cache:", error)
+            return
+
+        if generation == cls.generation:
+            cls.results[key] = result
+            cls.pending.discard(key)
+
+    @classmethod
+    def clear(cls):
+        """ Called when kernels might have been compiled, checks that are still running are invalidated """
+        cls.generation += 1
+        cls.results.clear()
+        cls.pending.clear()
+
+
 # Executed in separate thread
 def start_session(engine):
     try:
         engine.session.Start()
         engine.viewport_start_time = time()
+        engine.viewport_last_edit_time = engine.viewport_start_time
+        # Kernels might have been compiled during the start
+        KernelCacheStatus.clear()
     except ReferenceError:
         # Could not start render session because RenderEngine struct was deleted (caused
         # by the user cancelling the viewport render before this function is called)
@@ -119,6 +179,7 @@ def view_update(engine, context, depsgraph, changes=None):
         # We have to re-assign the session because it might have been replaced due to filmsize change
         engine.session = engine.exporter.update(depsgraph, context, engine.session, changes)
         engine.viewport_start_time = time()
+        engine.viewport_last_edit_time = engine.viewport_start_time
 
         if engine.framebuffer:
             engine.framebuffer.reset_denoiser()
@@ -148,13 +209,6 @@ def view_draw(engine, context, depsgraph):
         message = ""
 
         if luxcore_engine.endswith("OCL"):
-            # Create dummy renderconfig to check if we have to compile OpenCL kernels
-            luxcore_scene = pyluxcore.Scene()
-            definitions = {
-                "scene.camera.type": "perspective",
-            }
-            luxcore_scene.Parse(utils.create_props("", definitions))
-
             devices = scene.luxcore.devices
             definitions = {
                 "renderengine.type": "RTPATHOCL",
@@ -163,10 +217,8 @@ def view_draw(engine, context, depsgraph):
                 "scene.epsilon.max": config.max_epsilon,
                 "opencl.devices.select": devices.devices_to_selection_string(),
             }
-            config_props = utils.create_props("", definitions)
-            renderconfig = pyluxcore.RenderConfig(config_props, luxcore_scene)
 
-            if not renderconfig.HasCachedKernels():
+            if KernelCacheStatus.has_cached_kernels(luxcore_engine, definitions) is False:
                 gpu_backend = utils.get_addon_preferences(context).gpu_backend
                 message = f"Compiling {gpu_backend} kernels (just once, usually takes 15-30 minutes)"
 
@@ -197,6 +249,24 @@ def view_draw(engine, context, depsgraph):
         # replaced due to filmsize change.
         engine.session = engine.exporter.update(depsgraph, context, engine.session, changes)
         engine.viewport_start_time = time()
+        engine.viewport_last_edit_time = engine.viewport_start_time
+        framebuffer.reset_denoiser()
+    elif (engine.exporter.object_cache2.lod_hair
+            and time() - engine.viewport_last_edit_time > HAIR_REFINE_DELAY
+            and not utils.in_material_shading_mode(context)):
+        # The view was not changed for a moment, replace the reduced hair systems by the full
+        # ones, one per redraw so the UI stays responsive. Stops as soon as the user edits again.
+        engine.session = engine.exporter.refine_viewport_hair(depsgraph, context, engine.session)
+        engine.viewport_start_time = time()
+        framebuffer.reset_denoiser()
+        engine.tag_redraw()
+    elif engine.exporter.texture_proxy_users:
+        # Replace texture placeholders once their proxies are built in the background
+        if engine.exporter.update_texture_proxies(depsgraph, engine.session):
+            engine.viewport_start_time = time()
+            framebuffer.reset_denoiser()
+        else:
+            engine.tag_redraw()
 
     if utils.in_material_shading_mode(context):
         if not engine.session.IsInPause():
@@ -228,22 +298,24 @@ def view_draw(engine, context, depsgraph):
             engine.session.Pause()
         status_message = "(Paused)"
 
-        if framebuffer.denoiser_result_cached:
+        samples = engine.session.GetStats().Get("stats.renderengine.pass").GetInt()
+
+        if framebuffer.is_denoiser_active():
+            if framebuffer.is_denoiser_done():
+                framebuffer.load_denoiser_result(scene)
+            else:
+                status_message = "(Paused, Denoiser Working ...)"
+            # A progressive denoiser run might have finished with less samples than the final render
+            engine.tag_redraw()
+        elif framebuffer.is_denoiser_result_current(samples):
             status_message = "(Paused, Denoiser Done)"
-        else:
-            if framebuffer.is_denoiser_active():
-                if framebuffer.is_denoiser_done():
-                    status_message = "(Paused, Denoiser Done)"
-                    framebuffer.load_denoiser_result(scene)
-                else:
-                    status_message = "(Paused, Denoiser Working ...)"
-                    engine.tag_redraw()
-            elif context.scene.luxcore.viewport.get_denoiser(context) == "OIDN":
-                try:
-                    framebuffer.start_denoiser(engine.session)
-                    engine.tag_redraw()
-                except Exception as error:
-                    status_message = "Could not start denoiser: %s" % error
+        elif context.scene.luxcore.viewport.get_denoiser(context) == "OIDN":
+            try:
+                framebuffer.start_denoiser(engine.session, samples)
+                status_message = "(Paused, Denoiser Working ...)"
+                engine.tag_redraw()
+            except Exception as error:
+                status_message = "Could not start denoiser: %s" % error
     else:
         # Not in pause yet, keep drawing
         engine.session.WaitNewFrame()
@@ -252,7 +324,14 @@ def view_draw(engine, context, depsgraph):
         except RuntimeError as error:
             print("[Engine/Viewport] Error during UpdateStats():", error)
         framebuffer.update(engine.session, scene)
-        framebuffer.reset_denoiser()
+
+        if context.scene.luxcore.viewport.get_denoiser(context) == "OIDN":
+            # Denoise progressively in the background while rendering continues
+            samples = engine.session.GetStats().Get("stats.renderengine.pass").GetInt()
+            try:
+                framebuffer.schedule_denoiser(engine.session, scene, samples)
+            except Exception as error:
+                print("[Engine/Viewport] Could not start denoiser:", error)
         engine.tag_redraw()
 
     framebuffer.draw(engine, context, scene)
@@ -11,6 +11,7 @@ from . import (
     motion_blur, hair, halt, world,
 )
 from .light import WORLD_BACKGROUND_LIGHT_NAME
+from .image import TextureProxyCache
 from .caches.object_cache import supports_live_transform
 
 
@@ -44,9 +45,12 @@ class Change:
 
 
 class Exporter(object):
-    def __init__(self, stats=None):
+    def __init__(self, stats=None, is_animation_session=False):
         self.scene = None  # TODO I would like to remove this, the evaluated scene is temporary
         self.stats = stats
+        # If True, the session is kept alive between frames of an animation
+        # render and updated with update_animation_frame()
+        self.is_animation_session = is_animation_session
 
         self.config_cache = caches.StringCache()
         self.camera_cache = caches.CameraCache()
@@ -57,6 +61,7 @@ class Exporter(object):
         self.world_cache = caches.WorldCache()
         self.imagepipeline_cache = caches.StringCache()
         self.halt_cache = caches.StringCache()
+        self.world_props_cache = caches.StringCache()
         self.motion_blur_enabled = False
         
         # A dictionary with the following mapping:
@@ -64,12 +69,33 @@ class Exporter(object):
         # Most of the time node_key == luxcore_name, but some nodes have to insert
         # implicit textures n front of themselves which changes their luxcore_name.
         # Avoids re-exporting the same node multiple times.
-        # TODO: currently the node cache has to be cleared when an output node starts
-        # to export, because we don't have one global properties object.
+        # Note: the node cache is cleared when an output node starts to export, because the
+        # props of each material/volume/texture output have to define all textures they
+        # reference (they are cached and re-sent individually, see MaterialPropsCache).
+        # Work is shared across outputs on the level of pointer node trees (shared_node_cache).
         self.node_cache = {}
+        # Export-scoped cache for node trees referenced by pointer nodes, shared by all materials:
+        # {(node_tree_key, luxcore_name): (fingerprint, props, lightgroup_ids)}
+        # Entries are invalidated when the fingerprint of the referenced node tree changes.
+        self.shared_node_cache = {}
+        # {node_tree_key: (fingerprint, is_time_dependent)}, valid during one export or update
+        self.node_tree_fingerprints = {}
+        # {node_tree_key: utils.node.NodeTreeFeatures}, valid during one export or update
+        self.node_tree_features = {}
+        # {(material_key, luxcore_name): props} of materials converted by the Cycles node reader,
+        # valid during one export or update
+        self.cycles_material_cache = {}
 
         # If a light/material uses a lightgroup, the id is stored here during export
         self.lightgroup_cache = set()
+        # (filepath, size) of texture proxies that were not ready yet, collected during material export.
+        # None outside of material.convert(), other node trees (world, lights) only have a material
+        # update path and use the original images
+        self.pending_texture_proxies = None
+        # {(material name, library filepath): pending_texture_proxies} of materials exported with
+        # texture placeholders, they are exported again in update_texture_proxies()
+        self.texture_proxy_users = {}
+        self.is_viewport_render = False
 
     def create_session(self, depsgraph, context=None, engine=None, view_layer=None):
         # Notes:
@@ -83,6 +109,7 @@ class Exporter(object):
         stats = self.stats
         if stats:
             stats.reset()
+        self.is_viewport_render = context is not None
 
         # We have to run the compatibility code before export because it could be that
         # the user has linked/appended assets with node trees from previous versions of
@@ -134,6 +161,8 @@ class Exporter(object):
         # World
         world_props = world.convert(self, depsgraph, scene, is_viewport_render)
         scene_props.Set(world_props)
+        if self.is_animation_session:
+            self.world_props_cache.diff(world_props)
 
         print("🔥 [LuxExport Debug] Dumping scene properties before Parse():")
         print(scene_props.ToString())
@@ -148,6 +177,10 @@ class Exporter(object):
         # We can only duplicate the instances *after* the scene_props were parsed so the base
         # objects are available for luxcore_scene
         self.object_cache2.duplicate_instances(instances, luxcore_scene, stats)
+        if self.is_animation_session:
+            # Remember the state of the first frame so the following frames can be diffed against it
+            self.object_cache2.init_frame_state(instances)
+            self.material_cache.init_frame_state(depsgraph)
         # The instances dict can be quite large, delete explicitely (TODO maybe even call gc.collect()?)
         del instances
 
@@ -197,6 +230,9 @@ class Exporter(object):
 
         export_time = time() - start
         print("Export took %.1f s" % export_time)
+        if scene.luxcore.debug.enabled:
+            for mat_name, (hits, misses) in material.MaterialPropsCache.material_stats.items():
+                print(f'[Exporter] Material cache "{mat_name}": {hits} hits, {misses} misses')
         if stats:
             stats.export_time.value = export_time
             self._init_stats(stats, config_props, scene)
@@ -319,6 +355,9 @@ class Exporter(object):
         print("[Exporter] Update because of:", Change.to_string(changes))
         # Invalidate node cache
         self.node_cache.clear()
+        self.node_tree_fingerprints.clear()
+        self.node_tree_features.clear()
+        self.cycles_material_cache.clear()
 
         if changes & Change.CONFIG:
             # We already converted the new config settings during get_changes(), re-use them
@@ -359,6 +398,161 @@ class Exporter(object):
         # because it might have been replaced in _update_config()
         return session
 
+    def update_animation_frame(self, depsgraph, session, engine=None):
+        """
+        Used by persistent animation sessions: apply the differences between the current frame
+        and the previous one to the running session, so static meshes, images and compiled
+        kernels are kept. Returns False if a full re-export is required instead.
+        """
+        self.scene = depsgraph.scene_eval
+        scene = self.scene
+        stats = self.stats
+        print("[Exporter] Updating persistent session for frame", scene.frame_current)
+        start = time()
+        self.node_cache.clear()
+        self.node_tree_fingerprints.clear()
+        self.node_tree_features.clear()
+        self.cycles_material_cache.clear()
+        if stats:
+            stats.reset()
+
+        # Config changes (e.g. animated seed or a different film size) require a new session.
+        # Motion blur is computed by stepping through the frames, which we can't diff cheaply.
+        config_props = config.convert(self, scene, None, engine)
+        if self.motion_blur_enabled or self.config_cache.diff(str(config_props)):
+            self.scene = None
+            return False
+
+        luxcore_scene = session.GetRenderConfig().GetScene()
+        props = pyluxcore.Properties()
+        needs_full_export = False
+
+        # Note: the scene edit is done even if nothing changed, because it resets the film for the new frame
+        session.BeginSceneEdit()
+
+        try:
+            if self.camera_cache.diff(self, scene, depsgraph, None):
+                props.Set(self.camera_cache.props)
+
+            if self.object_cache2.update_frame(self, depsgraph, luxcore_scene, props, engine) is None:
+                needs_full_export = True
+            else:
+                self.material_cache.diff_frame(self, depsgraph, props)
+
+                world_props = world.convert(self, depsgraph, scene, False)
+                if self.world_props_cache.diff(world_props):
+                    if not scene.world or scene.world.luxcore.light == "none":
+                        luxcore_scene.DeleteLight(WORLD_BACKGROUND_LIGHT_NAME)
+                    props.Set(world_props)
+
+                luxcore_scene.Parse(props)
+        except Exception as error:
+            LuxCoreErrorLog.add_error(error)
+            import traceback
+            traceback.print_exc()
+            # The scene might be half updated
+            needs_full_export = True
+
+        try:
+            session.EndSceneEdit()
+        except RuntimeError as error:
+            import traceback
+            traceback.print_exc()
+            LuxCoreErrorLog.add_error(error)
+            needs_full_export = True
+
+        if needs_full_export:
+            self.scene = None
+            return False
+
+        if session.IsInPause():
+            session.Resume()
+
+        export_time = time() - start
+        print("Frame update took %.1f s" % export_time)
+        if stats:
+            stats.export_time.value = export_time
+            stats.light_count.value = luxcore_scene.GetLightCount()
+            self._init_stats(stats, config_props, scene)
+
+        # Do not hold reference to temporary data
+        self.scene = None
+        return True
+
+    def refine_viewport_hair(self, depsgraph, context, session):
+        """
+        Replace one of the hair systems that were exported with a reduced strand count
+        (viewport level of detail) by the full hair system.
+        Blocks the UI for the full conversion of this hair system, see ObjectCache2.refine_hair()
+        """
+        self.scene = depsgraph.scene_eval
+        print("[Exporter] Refining viewport hair (%d systems left)" % len(self.object_cache2.lod_hair))
+        self.node_cache.clear()
+        self.node_tree_features.clear()
+
+        luxcore_scene = session.GetRenderConfig().GetScene()
+        session.BeginSceneEdit()
+
+        try:
+            props = pyluxcore.Properties()
+            self.object_cache2.refine_hair(self, depsgraph, luxcore_scene, props, context)
+            luxcore_scene.Parse(props)
+        except Exception as error:
+            LuxCoreErrorLog.add_error(error)
+            import traceback
+            traceback.print_exc()
+
+        session.EndSceneEdit()
+
+        if session.IsInPause():
+            session.Resume()
+
+        # Do not hold reference to temporary data
+        self.scene = None
+        return session
+
+    def update_texture_proxies(self, depsgraph, session):
+        """
+        Export the materials whose texture proxies are done again, replacing the placeholders.
+        Returns True if materials were updated.
+        """
+        ready = [material_key for material_key, proxies in self.texture_proxy_users.items()
+                 if not any(TextureProxyCache.is_pending(*proxy) for proxy in proxies)]
+        if not ready:
+            return False
+
+        self.scene = depsgraph.scene_eval
+        print("[Exporter] Updating %d materials with finished texture proxies" % len(ready))
+        self.node_cache.clear()
+        self.node_tree_fingerprints.clear()
+        self.node_tree_features.clear()
+
+        luxcore_scene = session.GetRenderConfig().GetScene()
+        session.BeginSceneEdit()
+
+        try:
+            props = pyluxcore.Properties()
+            for material_key in ready:
+                del self.texture_proxy_users[material_key]
+                mat = bpy.data.materials.get(material_key)
+                if mat:
+                    _, mat_props = material.convert(self, depsgraph, mat, True)
+                    props.Set(mat_props)
+            luxcore_scene.Parse(props)
+        except Exception as error:
+            LuxCoreErrorLog.add_error(error)
+            import traceback
+            traceback.print_exc()
+
+        session.EndSceneEdit()
+
+        if session.IsInPause():
+            session.Resume()
+
+        # Do not hold reference to temporary data
+        self.scene = None
+        return True
+
     def update_session(self, changes, session):
         if changes & Change.IMAGEPIPELINE:
             session.Parse(self.imagepipeline_cache.props)
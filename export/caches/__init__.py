@@ -2,6 +2,7 @@ import bpy
 from ... import utils
 from ...utils import EXPORTABLE_OBJECTS
 from .. import camera, material
+from ...handlers import frame_change_pre
 
 from .object_cache import ObjectCache2, supports_live_transform
 
@@ -49,6 +50,11 @@ class CameraCache:
 class MaterialCache:
     def __init__(self):
         self.changed_materials = set()
+        # Only used in persistent animation sessions:
+        # {luxcore_name: props_string} of the materials that were converted for a frame
+        self.frame_props = {}
+        # Keys of the materials that are already in the session
+        self.frame_materials = set()
 
     def diff(self, depsgraph):
         if depsgraph.id_type_updated("MATERIAL"):
@@ -64,6 +70,59 @@ class MaterialCache:
             props.Set(mat_props)
         self.changed_materials.clear()
 
+    def init_frame_state(self, depsgraph):
+        """ Remember the materials exported for the first frame of a persistent animation session """
+        self.frame_materials = {utils.make_key(datablock) for datablock in depsgraph.ids
+                                if isinstance(datablock, bpy.types.Material)}
+
+    def diff_frame(self, exporter, depsgraph, props):
+        """
+        Used by persistent animation sessions. Blender does not report material updates
+        on frame changes during final render, so materials that can change between frames
+        (new, animated, time dependent or updated ones) are converted, and only those that
+        differ from the previous frame are added to props.
+        """
+        has_changes = False
+        updated_materials = set()
+
+        if depsgraph.id_type_updated("MATERIAL"):
+            updated_materials = {utils.make_key(dg_update.id) for dg_update in depsgraph.updates
+                                 if isinstance(dg_update.id, bpy.types.Material)}
+
+        for datablock in depsgraph.ids:
+            if not isinstance(datablock, bpy.types.Material):
+                continue
+
+            mat = datablock.original
+            key = utils.make_key(mat)
+            if (key in self.frame_materials and key not in updated_materials
+                    and not _material_may_change_between_frames(mat)):
+                continue
+            self.frame_materials.add(key)
+
+            lux_mat_name, mat_props = material.convert(exporter, depsgraph, mat, False)
+            props_str = str(mat_props)
+
+            if self.frame_props.get(lux_mat_name) != props_str:
+                self.frame_props[lux_mat_name] = props_str
+                props.Set(mat_props)
+                has_changes = True
+
+        return has_changes
+
+
+def _material_may_change_between_frames(mat):
+    if frame_change_pre.is_time_dependent_user(mat):
+        # Image sequences, OpenVDB files and time info nodes
+        return True
+
+    # Keyframes or drivers on the material or its node tree
+    for datablock in (mat, mat.luxcore.node_tree, mat.node_tree):
+        anim = getattr(datablock, "animation_data", None)
+        if anim and (anim.action or anim.drivers):
+            return True
+    return False
+
 
 class VisibilityCache:
     def __init__(self):
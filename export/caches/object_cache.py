@@ -1,4 +1,5 @@
 import bpy
+import hashlib
 from array import array
 from functools import lru_cache
 from time import time
@@ -9,6 +10,9 @@ from .. import mesh_converter
 from ..hair import (
     convert_hair, warn_about_missing_uvs, set_hair_props, 
     make_hair_shape_name, get_hair_material_index,convert_hair_curves,
+    make_hair_fingerprint,
+    is_simulated,
+    is_edited,
 )
 from .exported_data import ExportedObject, ExportedPart
 from .. import light, material
@@ -25,38 +29,35 @@ class TriAOVDataIndices:
 MAX_PARTICLES_FOR_LIVE_TRANSFORM = 2000
 
 
-def uses_pointiness(node_tree):
+def get_node_tree_features(exporter, node_tree):
+    # The features of each node tree are only computed once per export or update
+    return utils_node.get_node_tree_features(node_tree, exporter.node_tree_features)
+
+
+def uses_pointiness(exporter, node_tree):
     # TODO better check would be if the node is linked to the output and actually used
-    return utils_node.has_nodes(node_tree, "LuxCoreNodeTexPointiness", True)
+    return get_node_tree_features(exporter, node_tree).pointiness
 
 
-def uses_random_per_island_uniform_float(node_tree):
+def uses_random_per_island_uniform_float(exporter, node_tree):
     # TODO better check would be if the node is linked to the output and actually used
-    return utils_node.has_nodes(node_tree, "LuxCoreNodeTexRandomPerIsland", True)
+    return get_node_tree_features(exporter, node_tree).random_per_island_float
 
 
-def uses_random_per_island_int(node_tree):
+def uses_random_per_island_int(exporter, node_tree):
     # TODO better check would be if the node is linked to the output and actually used
-    for node in utils_node.find_nodes_multi(node_tree, {"LuxCoreNodeTexMapping2D", "LuxCoreNodeTexMapping3D"}, True):
-        if node.mapping_type in {"uvrandommapping2d", "localrandommapping3d"} and node.seed_type == "mesh_islands":
-            return True
-    return False
+    return get_node_tree_features(exporter, node_tree).random_per_island_int
 
 
-def needs_edge_detector_shape(node_tree):
+def needs_edge_detector_shape(exporter, node_tree):
     # TODO better check would be if the node is linked to the output and actually used
-    for node in utils_node.find_nodes(node_tree, "LuxCoreNodeTexWireframe", True):
-        if node.hide_planar_edges:
-            return True
-    return False
+    return get_node_tree_features(exporter, node_tree).edge_detector
 
 
-def uses_displacement(obj):
+def uses_displacement(exporter, obj):
     for mat_slot in obj.material_slots:
         mat = mat_slot.material
-        if (mat and mat.luxcore.node_tree
-                and utils_node.has_nodes_multi(mat.luxcore.node_tree, {"LuxCoreNodeShapeHeightDisplacement",
-                                                                       "LuxCoreNodeShapeVectorDisplacement"}, True)):
+        if mat and mat.luxcore.node_tree and get_node_tree_features(exporter, mat.luxcore.node_tree).displacement:
             return True
     return False
 
@@ -70,7 +71,7 @@ def define_shapes(input_shape, node_tree, exporter, depsgraph, scene_props):
 
     # Add some shapes at the end that are required by some nodes in the node tree
 
-    if uses_pointiness(node_tree):
+    if uses_pointiness(exporter, node_tree):
         # Note: Since Blender still does not make use of the vertex alpha channel
         # as of 2.82, we use it to store the pointiness information.
         pointiness_shape = input_shape + "_pointiness"
@@ -79,8 +80,8 @@ def define_shapes(input_shape, node_tree, exporter, depsgraph, scene_props):
         scene_props.Set(pyluxcore.Property(prefix + "source", shape))
         shape = pointiness_shape
 
-    _uses_random_per_island_uniform_float = uses_random_per_island_uniform_float(node_tree)
-    _uses_random_per_island_int = uses_random_per_island_int(node_tree)
+    _uses_random_per_island_uniform_float = uses_random_per_island_uniform_float(exporter, node_tree)
+    _uses_random_per_island_int = uses_random_per_island_int(exporter, node_tree)
     if _uses_random_per_island_uniform_float or _uses_random_per_island_int:
         island_aov_index = TriAOVDataIndices.RANDOM_PER_ISLAND_INT
 
@@ -105,7 +106,7 @@ def define_shapes(input_shape, node_tree, exporter, depsgraph, scene_props):
             scene_props.Set(pyluxcore.Property(prefix + "dstdataindex", TriAOVDataIndices.RANDOM_PER_ISLAND_FLOAT))
             shape = random_tri_aov_shape
 
-    if needs_edge_detector_shape(node_tree):
+    if needs_edge_detector_shape(exporter, node_tree):
         edge_detector_shape = input_shape + "_edge_detector"
         prefix = "scene.shapes." + edge_detector_shape + "."
         scene_props.Set(pyluxcore.Property(prefix + "type", "edgedetectoraov"))
@@ -242,6 +243,16 @@ class ObjectCache2:
         self.exported_objects = {}
         self.exported_meshes = {}
         self.exported_hair = {}
+        # {psys_key: fingerprint}, used to reuse hair shapes if the emitter was updated but the hair did not change
+        self.hair_fingerprints = {}
+        # Keys of hair systems that were exported with a reduced strand count in viewport render
+        self.lod_hair = set()
+        self.is_refining_hair = False
+
+        # Only used in persistent animation sessions, see update_frame()
+        self.dupli_signatures = {}
+        self.dupli_base_ids = set()
+        self.hair_curves_transforms = {}
 
     def first_run(self, exporter, depsgraph, view_layer, engine, luxcore_scene, scene_props, context):
         is_viewport_render = bool(context)
@@ -386,6 +397,7 @@ class ObjectCache2:
                                     lux_shape = define_shapes(lux_shape, node_tree, exporter, depsgraph, scene_props)
 
                             self.exported_hair[obj_key] = lux_shape
+                            self.hair_curves_transforms[obj_key] = dg_obj_instance.matrix_world.copy()
                         if lux_shape:
                             lux_mat, mat_props, node_tree = export_material(obj, 0, exporter, depsgraph,
                                                                             is_viewport_render)
@@ -424,10 +436,19 @@ class ObjectCache2:
 
                 try:
                     lux_shape = self.exported_hair[psys_key]
+                    self._count_hair_cache(exporter, True)
                 except KeyError:
+                    self._count_hair_cache(exporter, False)
+                    strand_fraction = 1
+                    hair_settings = settings.luxcore.hair
+                    if is_viewport_render and hair_settings.use_viewport_lod and not self.is_refining_hair:
+                        strand_fraction = hair_settings.viewport_lod_strands / 100
+                        if strand_fraction < 1 and hair_settings.viewport_lod_refine:
+                            self.lod_hair.add(psys_key)
+
                     lux_shape = convert_hair(exporter, obj, obj_key, psys, depsgraph, luxcore_scene,
                                              scene_props, is_viewport_render, is_for_duplication,
-                                             dg_obj_instance.matrix_world, visible_to_cam, engine)
+                                             dg_obj_instance.matrix_world, visible_to_cam, engine, strand_fraction)
                     if lux_shape:
                         mat = get_material(obj, mat_index, depsgraph)
                         if mat:
@@ -436,7 +457,11 @@ class ObjectCache2:
                                 lux_shape = define_shapes(lux_shape, node_tree, exporter, depsgraph, scene_props)
                         
                         self.exported_hair[psys_key] = lux_shape
-                        
+                        # Only viewport and animation sessions are updated, so the fingerprint can be reused
+                        if is_viewport_render or exporter.is_animation_session:
+                            self.hair_fingerprints[psys_key] = make_hair_fingerprint(obj, psys, is_for_duplication,
+                                                                                     exporter.scene)
+
                 if lux_shape:
                     lux_mat, mat_props, node_tree = export_material(obj, mat_index, exporter, depsgraph,
                                                                     is_viewport_render)
@@ -463,8 +488,10 @@ class ObjectCache2:
         transform = dg_obj_instance.matrix_world
 
         # Objects with displacement in the node tree are instanced to avoid discrepancies between viewport and final render
+        # In persistent animation sessions, everything is instanced so objects can be moved between frames
         use_instancing = is_viewport_render or dg_obj_instance.is_instance or utils.can_share_mesh(obj.original) \
-                         or (exporter.motion_blur_enabled and obj.luxcore.enable_motion_blur) or uses_displacement(obj)
+                         or (exporter.motion_blur_enabled and obj.luxcore.enable_motion_blur) or uses_displacement(exporter, obj) \
+                         or exporter.is_animation_session
 
         mesh_key = self._get_mesh_key(obj, use_instancing, is_viewport_render)
 
@@ -560,7 +587,7 @@ class ObjectCache2:
                                 # Can't use the memory address of the psys as key because it changes
                                 # when the psys is updated (e.g. because some hair moves)
                                 psys_key = make_psys_key(obj, psys, True)
-                                del self.exported_hair[psys_key]
+                                self._forget_hair_if_changed(exporter, obj, psys, psys_key, True)
                     elif obj.type == "LIGHT":
                         obj_key = utils.make_key(obj)
                         props, exported_stuff = light.convert_light(exporter, obj, obj_key, depsgraph, luxcore_scene,
@@ -611,3 +638,191 @@ class ObjectCache2:
                                   luxcore_scene, scene_props, is_viewport_render)
 
         #self._debug_info()
+
+    def init_frame_state(self, instances):
+        """
+        Remember the instancing state of the first frame of a persistent animation session.
+        Has to be called before the instances dict returned by first_run() is deleted.
+        """
+        self.dupli_signatures = {}
+        self.dupli_base_ids = set()
+
+        for key, duplis in instances.items():
+            if duplis is None:
+                self.dupli_signatures[key] = None
+                continue
+
+            # Same layout as in update_frame(): the first instance followed by all duplicates
+            matrices = array("f", utils.matrix_to_list(duplis.exported_obj.transform))
+            matrices.extend(duplis.matrices)
+            self.dupli_signatures[key] = hashlib.md5(matrices).digest()
+            self.dupli_base_ids.add(id(duplis.exported_obj))
+
+    def update_frame(self, exporter, depsgraph, luxcore_scene, scene_props, engine=None):
+        """
+        Used by persistent animation sessions. Blender does not report depsgraph updates on frame
+        changes during final render, so the object instances of the current frame are compared
+        with the ones of the previous frame and only the changed objects are re-exported.
+        Returns None if a full re-export is required (e.g. because particle instances moved).
+        """
+        scene = depsgraph.scene_eval
+        view_layer = depsgraph.view_layer_eval
+        seen_keys = set()
+        dupli_signatures = {}
+        dupli_matrices = {}
+
+        for index, dg_obj_instance in enumerate(depsgraph.object_instances):
+            obj = dg_obj_instance.object
+
+            if dg_obj_instance.is_instance and obj.type in MESH_OBJECTS:
+                # These instances were created with DuplicateObject() in first_run() and can't be
+                # edited individually. We only check if they are still the same as in the first frame.
+                key = obj.original.as_pointer()
+                if self.dupli_signatures.get(key, False) is None:
+                    # Not exportable, e.g. a curve with zero faces
+                    dupli_signatures[key] = None
+                    continue
+
+                try:
+                    matrices = dupli_matrices[key]
+                except KeyError:
+                    matrices = dupli_matrices[key] = array("f", [])
+                matrices.extend(pyluxcore.BlenderMatrix4x4ToList(dg_obj_instance.matrix_world.copy()))
+                continue
+
+            if not utils.is_instance_visible(dg_obj_instance, obj, None):
+                continue
+
+            if engine and index % 500 == 0 and engine.test_break():
+                return None
+
+            obj_key = utils.make_key_from_instance(dg_obj_instance)
+            seen_keys.add(obj_key)
+
+            if obj.type == "LIGHT":
+                # Lights are cheap to export and their settings or node trees might be animated.
+                # Note that convert_light() deletes the old light, so the props always have to be set.
+                props, exported_stuff = light.convert_light(exporter, obj, obj_key, depsgraph, luxcore_scene,
+                                                            dg_obj_instance.matrix_world.copy(), False)
+                if exported_stuff:
+                    self.exported_objects[obj_key] = exported_stuff
+                    scene_props.Set(props)
+                continue
+
+            if obj_key in self.hair_curves_transforms:
+                if (utils.has_animated_geometry(obj, scene)
+                        or self.hair_curves_transforms[obj_key] != dg_obj_instance.matrix_world):
+                    self._convert_obj(exporter, dg_obj_instance, obj, depsgraph, luxcore_scene,
+                                      scene_props, False, view_layer, engine)
+                continue
+
+            exported_obj = self.exported_objects.get(obj_key)
+            transform_changed = exported_obj is not None and exported_obj.transform != dg_obj_instance.matrix_world
+            # Particle hair is exported in world space, so it has to be re-exported if the emitter moves
+            has_hair = any(psys.settings.type == "HAIR" for psys in obj.particle_systems)
+
+            if (exported_obj is None or utils.has_animated_geometry(obj, scene)
+                    or (transform_changed and has_hair)):
+                if exported_obj:
+                    exported_obj.delete(luxcore_scene)
+                    del self.exported_objects[obj_key]
+                self._forget_geometry(exporter, obj)
+                self._convert_obj(exporter, dg_obj_instance, obj, depsgraph, luxcore_scene,
+                                  scene_props, False, view_layer, engine)
+                continue
+
+            updated = transform_changed
+            if transform_changed:
+                exported_obj.transform = dg_obj_instance.matrix_world.copy()
+
+            obj_id = utils.make_object_id(dg_obj_instance)
+            if exported_obj.obj_id != obj_id:
+                exported_obj.obj_id = obj_id
+                updated = True
+
+            visible_to_cam = utils.visible_to_camera(dg_obj_instance, False, view_layer)
+            if exported_obj.visible_to_camera != visible_to_cam:
+                exported_obj.visible_to_camera = visible_to_cam
+                updated = True
+
+            if updated:
+                scene_props.Set(exported_obj.get_props())
+
+        for key, matrices in dupli_matrices.items():
+            dupli_signatures[key] = hashlib.md5(matrices).digest()
+        if dupli_signatures != self.dupli_signatures:
+            return None
+
+        # Objects that are no longer visible in this frame
+        for key in self.exported_objects.keys() - seen_keys:
+            exported_obj = self.exported_objects[key]
+            if id(exported_obj) in self.dupli_base_ids:
+                continue
+            exported_obj.delete(luxcore_scene)
+            del self.exported_objects[key]
+
+        for key in self.hair_curves_transforms.keys() - seen_keys:
+            del self.hair_curves_transforms[key]
+            lux_obj = self.exported_hair.pop(key, None)
+            if lux_obj:
+                luxcore_scene.DeleteObject(lux_obj)
+
+        return True
+
+    def refine_hair(self, exporter, depsgraph, luxcore_scene, scene_props, context):
+        """
+        Re-export one of the hair systems that were exported with a reduced strand
+        count (viewport level of detail) with all strands. Called repeatedly until
+        lod_hair is empty, so the UI is only blocked for the export of one hair system.
+        Note that this export runs synchronously on the UI thread: the strands are read
+        from Blender data, which is not safe outside of the main thread. This is why
+        the viewport level of detail is disabled by default.
+        """
+        psys_key = self.lod_hair.pop()
+        self.exported_hair.pop(psys_key, None)
+        self.hair_fingerprints.pop(psys_key, None)
+
+        self.is_refining_hair = True
+        try:
+            for dg_obj_instance in depsgraph.object_instances:
+                if dg_obj_instance.is_instance and not supports_live_transform(dg_obj_instance.particle_system):
+                    continue
+
+                obj = dg_obj_instance.object
+                if not any(make_psys_key(obj, psys, True) == psys_key for psys in obj.particle_systems):
+                    continue
+                if not utils.is_instance_visible(dg_obj_instance, obj, context):
+                    continue
+
+                # The other hair systems of the object are taken from the hair cache
+                self._convert_obj(exporter, dg_obj_instance, obj, depsgraph, luxcore_scene,
+                                  scene_props, True)
+        finally:
+            self.is_refining_hair = False
+
+    def _forget_geometry(self, exporter, obj):
+        """ Remove the cached mesh and changed hair of this object so they are re-exported """
+        self.exported_meshes.pop(self._get_mesh_key(obj, True, False), None)
+
+        for psys in obj.particle_systems:
+            self._forget_hair_if_changed(exporter, obj, psys, make_psys_key(obj, psys, False), False)
+
+    def _forget_hair_if_changed(self, exporter, obj, psys, psys_key, is_for_duplication):
+        fingerprint = self.hair_fingerprints.get(psys_key)
+        if (fingerprint and not is_simulated(psys) and not is_edited(obj)
+                and fingerprint == make_hair_fingerprint(obj, psys, is_for_duplication, exporter.scene)):
+            # The hair shape can be reused
+            return
+
+        self.exported_hair.pop(psys_key, None)
+        self.hair_fingerprints.pop(psys_key, None)
+
+    @staticmethod
+    def _count_hair_cache(exporter, is_hit):
+        if exporter.stats:
+            hits, misses = exporter.stats.hair_cache.value
+            if is_hit:
+                hits += 1
+            else:
+                misses += 1
+            exporter.stats.hair_cache.value = (hits, misses)
@@ -8,6 +8,10 @@ from mathutils import Matrix
 ERROR_VALUE = 0
 MISSING_IMAGE_COLOR = [1, 0, 1]
 
+# Results of _node() calls during the current conversion, so subgraphs that feed
+# several inputs are converted only once: {(node, output socket, group node stack): result}
+_subgraph_cache = None
+
 math_operation_map = {
     "MULTIPLY": "scale",
     "GREATER_THAN": "greaterthan",
@@ -25,7 +29,13 @@ def convert(material, props, luxcore_name, obj_name=""):
     if link is None:
         return black(luxcore_name)
 
-    result = _node(link.from_node, link.from_socket, props, material, luxcore_name, obj_name)
+    global _subgraph_cache
+    _subgraph_cache = {}
+    try:
+        result = _node(link.from_node, link.from_socket, props, material, luxcore_name, obj_name)
+    finally:
+        _subgraph_cache = None
+
     if result == ERROR_VALUE:
         return black(luxcore_name)
 
@@ -58,6 +68,22 @@ def _socket(socket, props, material, obj_name, group_node):
 
 
 def _node(node, output_socket, props, material, luxcore_name=None, obj_name="", group_node_stack=None):
+    if luxcore_name is not None or _subgraph_cache is None:
+        # Nodes with an explicitly passed name can't be shared
+        return _convert_node(node, output_socket, props, material, luxcore_name, obj_name, group_node_stack)
+
+    group_key = tuple(n.as_pointer() for n in group_node_stack) if group_node_stack else ()
+    cache_key = (node.as_pointer(), output_socket.identifier, group_key)
+
+    try:
+        return _subgraph_cache[cache_key]
+    except KeyError:
+        result = _convert_node(node, output_socket, props, material, luxcore_name, obj_name, group_node_stack)
+        _subgraph_cache[cache_key] = result
+        return result
+
+
+def _convert_node(node, output_socket, props, material, luxcore_name=None, obj_name="", group_node_stack=None):
     if luxcore_name is None:
         luxcore_name = str(node.as_pointer()) + output_socket.name
         if group_node_stack:
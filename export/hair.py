@@ -1,7 +1,9 @@
 from mathutils import Matrix
 import bpy
+import hashlib
 import math
 import numpy as np
+from itertools import chain, repeat
 from .. import utils
 from ..utils import node as utils_node
 import pyluxcore
@@ -9,6 +11,9 @@ from .image import ImageExporter
 from time import time
 from ..utils.errorlog import LuxCoreErrorLog
 
+# Number of strands that are collected between progress updates and test_break() checks
+HAIR_CHUNK_SIZE = 50000
+
 
 def find_psys_modifier(obj, psys):
     for mod in obj.modifiers:
@@ -17,7 +22,7 @@ def find_psys_modifier(obj, psys):
     return None
 
 
-def convert_uvs(obj, psys, settings, uv_textures, engine, strands_count, start, dupli_count, mod, num_children):
+def convert_uvs(obj, psys, settings, uv_textures, engine, strand_indices, mod, num_children):
     failure = np.empty(shape=0, dtype=np.float32)
 
     if settings.use_active_uv_map or settings.uv_map_name not in obj.data.uv_layers:
@@ -34,19 +39,16 @@ def convert_uvs(obj, psys, settings, uv_textures, engine, strands_count, start,
 
     if engine:
         engine.update_stats("Exporting...", "[%s: %s] Preparing %d UV coordinates"
-                             % (obj.name, psys.name, strands_count))
-
-    first_particle = psys.particles[0]
-    f = psys.uv_on_emitter
-    uvs = np.fromiter((elem
-                       for i in range(start, dupli_count)
-                       for elem in f(mod, particle=psys.particles[i] if num_children == 0 else first_particle,
-                                     particle_no=i, uv_no=uv_index)),
+                             % (obj.name, psys.name, len(strand_indices)))
+
+    particles = _get_emitter_particles(psys, strand_indices, num_children)
+    uvs = np.fromiter(chain.from_iterable(map(psys.uv_on_emitter, repeat(mod), particles,
+                                              strand_indices, repeat(uv_index))),
                       dtype=np.float32,
-                      count=(dupli_count - start) * 2)
+                      count=len(strand_indices) * 2)
     return uvs
 
-def convert_colors(obj, psys, settings, vertex_colors, engine, strands_count, start, dupli_count, mod, num_children):
+def convert_colors(obj, psys, settings, vertex_colors, engine, strand_indices, mod, num_children):
     failure = np.empty(shape=0, dtype=np.float32)
 
     if settings.use_active_vertex_color_layer or settings.vertex_color_layer_name not in vertex_colors:
@@ -63,19 +65,76 @@ def convert_colors(obj, psys, settings, vertex_colors, engine, strands_count, st
 
     if engine:
         engine.update_stats("Exporting...", "[%s: %s] Preparing %d vertex colors"
-                            % (obj.name, psys.name, strands_count))
-
-    first_particle = psys.particles[0]
-    f = psys.mcol_on_emitter
-    colors = np.fromiter((elem
-                          for i in range(start, dupli_count)
-                          for elem in f(mod, psys.particles[i] if num_children == 0 else first_particle,
-                                        particle_no= i, vcol_no=vertex_color_index)),
+                            % (obj.name, psys.name, len(strand_indices)))
+
+    particles = _get_emitter_particles(psys, strand_indices, num_children)
+    colors = np.fromiter(chain.from_iterable(map(psys.mcol_on_emitter, repeat(mod), particles,
+                                                 strand_indices, repeat(vertex_color_index))),
                          dtype=np.float32,
-                         count=(dupli_count - start) * 3)
+                         count=len(strand_indices) * 3)
     return colors
 
 
+def _get_emitter_particles(psys, strand_indices, num_children):
+    if num_children == 0:
+        return map(psys.particles.__getitem__, strand_indices)
+    else:
+        # Children use the first particle, only the particle_no matters for them
+        return repeat(psys.particles[0], len(strand_indices))
+
+
+def get_strand_indices(psys, start, dupli_count, strand_fraction):
+    """
+    Returns the particle numbers of the strands to export. If strand_fraction is
+    smaller than 1, a random subset is chosen. The subset is stable for a given
+    particle system seed, and the subset of a smaller fraction is always contained
+    in the subset of a larger one, so refining only adds strands.
+    """
+    if strand_fraction >= 1:
+        return range(start, dupli_count)
+
+    rng = np.random.default_rng(psys.seed)
+    selected = rng.random(dupli_count - start) < strand_fraction
+    if not selected.any():
+        selected[0] = True
+    return (np.flatnonzero(selected) + start).tolist()
+
+
+def convert_points(obj, psys, engine, strand_indices, points_per_strand):
+    """
+    Collects the points of all exported strands into a flat float32 array.
+    Blender has no bulk accessor for the evaluated hair paths (children and
+    interpolated steps only exist in the path cache), so co_hair() is called
+    per point, but all iteration is done in C (map/chain/fromiter) and the
+    result is written into a preallocated array in chunks of strands.
+    Returns None if the export was cancelled.
+    """
+    strands_count = len(strand_indices)
+    points = np.empty(shape=strands_count * points_per_strand * 3, dtype=np.float32)
+    co_hair = psys.co_hair
+    step_numbers = list(range(points_per_strand))
+
+    for chunk_start in range(0, strands_count, HAIR_CHUNK_SIZE):
+        chunk_end = min(chunk_start + HAIR_CHUNK_SIZE, strands_count)
+        chunk_strands = chunk_end - chunk_start
+        particle_numbers = chain.from_iterable(map(repeat, strand_indices[chunk_start:chunk_end],
+                                                   repeat(points_per_strand)))
+        coords = map(co_hair, repeat(obj), particle_numbers, step_numbers * chunk_strands)
+
+        offset = chunk_start * points_per_strand * 3
+        count = chunk_strands * points_per_strand * 3
+        points[offset:offset + count] = np.fromiter(chain.from_iterable(coords), dtype=np.float32, count=count)
+
+        if engine:
+            progress = chunk_end / strands_count
+            engine.update_stats("Exporting...", "[%s: %s] Preparing points (%d%%)"
+                                % (obj.name, psys.name, progress * 100))
+            if engine.test_break():
+                return None
+
+    return points
+
+
 def warn_about_missing_uvs(obj, node_tree):
     # TODO once we have a triplanar option for imagemaps, ignore imagemaps with
     #  triplanar in this check because they have no problems with missing UVs
@@ -87,7 +146,7 @@ def warn_about_missing_uvs(obj, node_tree):
 
 
 def convert_hair(exporter, obj, obj_key, psys, depsgraph, luxcore_scene, scene_props, is_viewport_render,
-                 is_for_duplication, instance_matrix_world, visible_to_camera, engine=None):
+                 is_for_duplication, instance_matrix_world, visible_to_camera, engine=None, strand_fraction=1):
     try:
         assert psys.settings.render_type == "PATH"
         scene = depsgraph.scene_eval
@@ -125,22 +184,18 @@ def convert_hair(exporter, obj, obj_key, psys, depsgraph, luxcore_scene, scene_p
             start = num_parents + num_virtual_parents
 
         # Collect point/color/uv information from Blender
-        # (unfortunately this can't be accelerated in C++)
         collection_start = time()
-        strands_count = dupli_count - start
+        strand_indices = get_strand_indices(psys, start, dupli_count, strand_fraction)
+        if strand_fraction < 1:
+            # Thicker strands keep the approximate density of the reduced hair system
+            strand_diameter /= math.sqrt(strand_fraction)
+            print("[%s: %s] Viewport LOD: exporting %d of %d strands"
+                  % (obj.name, psys.name, len(strand_indices), dupli_count - start))
 
         # Point coordinates as a flattened numpy array
-        point_count = strands_count * points_per_strand
-        if engine:
-            engine.update_stats("Exporting...", "[%s: %s] Preparing %d points"
-                                % (obj.name, psys.name, point_count))
-        co_hair = psys.co_hair
-        points = np.fromiter((elem
-                              for pindex in range(start, dupli_count)
-                              for step in range(points_per_strand)
-                              for elem in co_hair(object=obj, particle_no=pindex, step=step)),
-                             dtype=np.float32,
-                             count=point_count * 3)
+        points = convert_points(obj, psys, engine, strand_indices, points_per_strand)
+        if points is None:
+            return None
 
         colors = np.empty(shape=0, dtype=np.float32)
         uvs = np.empty(shape=0, dtype=np.float32)
@@ -162,11 +217,11 @@ def convert_hair(exporter, obj, obj_key, psys, depsgraph, luxcore_scene, scene_p
                     LuxCoreErrorLog.add_warning(msg, obj_name=obj.name)
             elif settings.export_color == "vertex_color":
                 colors = convert_colors(obj, psys, settings, vertex_colors, engine,
-                                        strands_count, start, dupli_count, mod, num_children)
+                                        strand_indices, mod, num_children)
 
             if uvs_needed:
                 uvs = convert_uvs(obj, psys, settings, uv_textures, engine,
-                                  strands_count, start, dupli_count, mod, num_children)
+                                  strand_indices, mod, num_children)
 
             obj.to_mesh_clear()
 
@@ -231,6 +286,59 @@ def set_hair_props(scene_props, lux_obj, lux_shape, lux_mat, visible_to_camera,
         scene_props.Set(pyluxcore.Property(prefix + "transformation", identity_matrix))
 
 
+def make_hair_fingerprint(obj, psys, is_for_duplication, scene):
+    """
+    Cheap fingerprint of a particle hair system: particle settings, particle counts,
+    the emitter vertices, root, rotation and length of all parent strands and the material
+    node tree features that add shapes on top of the hair shape.
+    Used to find out if a hair shape can be reused after an update of the emitter.
+    The hair keys are not part of the fingerprint, they can't be read in bulk. They only
+    change in particle edit mode, where the hair is always exported again (see is_edited()).
+    """
+    hasher = hashlib.md5()
+    utils_node.update_hash_from_struct(hasher, psys.settings, scene)
+    hasher.update(f"{psys.seed}{psys.child_seed}{len(psys.particles)}{len(psys.child_particles)}".encode())
+
+    if not is_for_duplication:
+        # The transformation is baked into the hair coordinates
+        hasher.update(str(tuple(tuple(row) for row in obj.matrix_world)).encode())
+
+    if obj.type == "MESH":
+        vertices = obj.data.vertices
+        coords = np.empty(shape=len(vertices) * 3, dtype=np.float32)
+        vertices.foreach_get("co", coords)
+        hasher.update(coords.tobytes())
+
+    particles = psys.particles
+    for attribute, size in (("location", 3), ("rotation", 4), ("hair_length", 1)):
+        values = np.empty(shape=len(particles) * size, dtype=np.float32)
+        particles.foreach_get(attribute, values)
+        hasher.update(values.tobytes())
+
+    mat_index = get_hair_material_index(psys)
+    if mat_index < len(obj.material_slots):
+        mat = obj.material_slots[mat_index].material
+        if mat and mat.luxcore.node_tree:
+            features = utils_node.get_node_tree_features(mat.luxcore.node_tree)
+            hasher.update(str([getattr(features, attr) for attr in features.__slots__]).encode())
+
+    return hasher.hexdigest()
+
+
+def is_simulated(psys):
+    """
+    Simulated hair (hair dynamics, baked or currently baking point cache) changes the
+    evaluated strands without changing the hair keys, so it can't be fingerprinted
+    """
+    point_cache = psys.point_cache
+    return psys.use_hair_dynamics or point_cache.is_baked or point_cache.is_baking
+
+
+def is_edited(obj):
+    """ Hair keys are combed, cut etc. in particle edit mode, which the fingerprint does not cover """
+    return obj.original.mode == "PARTICLE_EDIT"
+
+
 def make_hair_shape_name(obj_key, psys):
     # Can't use the memory address of the psys as key because it changes
     # when the psys is updated (e.g. because some hair moves)
@@ -252,18 +360,17 @@ def get_strand_seg(idx, strand):
 def convert_hair_curves(exporter, depsgraph, obj, obj_key, luxcore_scene, is_for_duplication):
     start_time = time()
     lux_shape_name = obj_key
-    time_elapsed = time() - start_time
     scene = depsgraph.scene_eval
 
-    strands = obj.data.curves
+    curves = obj.data
 
-    points_per_strand = np.fromiter((strand.points_length
-                  for strand in strands), dtype=np.int32)
+    # Read all attribute buffers with foreach_get, the strand lengths follow from the curve offsets
+    offsets = np.empty(shape=len(curves.curve_offset_data), dtype=np.int32)
+    curves.curve_offset_data.foreach_get("value", offsets)
+    points_per_strand = np.diff(offsets).astype(np.int32)
 
-    points = np.fromiter((elem
-                  for strand in strands
-                  for idx in range(strand.points_length)
-                  for elem in strand.points[idx].position), dtype=np.float32)
+    points = np.empty(shape=len(curves.points) * 3, dtype=np.float32)
+    curves.attributes["position"].data.foreach_get("vector", points)
 
     colors = np.empty(shape=0, dtype=np.float32)
     uvs = np.empty(shape=0, dtype=np.float32)
@@ -295,11 +402,10 @@ def convert_hair_curves(exporter, depsgraph, obj, obj_key, luxcore_scene, is_for
     #         colors = convert_colors(obj, psys, settings, vertex_colors, engine,
     #                                 strands_count, start, dupli_count, mod, num_children)
 
-        if uvs_needed:
-            uvs = np.fromiter((elem
-                           for uv_coord in obj.data.attributes['surface_uv_coordinate'].data
-                           for elem in uv_coord.vector),
-                          dtype=np.float32)
+        if uvs_needed and "surface_uv_coordinate" in curves.attributes:
+            uv_data = curves.attributes["surface_uv_coordinate"].data
+            uvs = np.empty(shape=len(uv_data) * 2, dtype=np.float32)
+            uv_data.foreach_get("vector", uvs)
 
     if len(uvs) == 0:
         copy_uvs = False
@@ -317,6 +423,7 @@ def convert_hair_curves(exporter, depsgraph, obj, obj_key, luxcore_scene, is_for
     if not success:
         return None
 
+    time_elapsed = time() - start_time
     if exporter.stats:
         exporter.stats.export_time_hair.value += time_elapsed
     return lux_shape_name
\ No newline at end of file
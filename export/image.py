@@ -1,17 +1,34 @@
 import bpy
+import hashlib
 import tempfile
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from .. import utils
 
+try:
+    import OpenImageIO as oiio
+except ImportError:
+    oiio = None
+
 
 class ImageExporter(object):
     """
     This class is a singleton
     """
+    # Images that could not be written to the persistent cache (e.g. packed images with unsaved
+    # changes), they are deleted in cleanup(). {key: NamedTemporaryFile}
     temp_images = {}
+    # Cache files used in this session, they are never removed by the size limit. {key: filepath}
+    cached_images = {}
+    # Packed and generated images are written to this directory, the file names are content hashes,
+    # so the files can be re-used by later sessions and renders of the same images
+    CACHE_DIR = os.path.join(tempfile.gettempdir(), "BlendLuxCore_image_cache")
+    # Used if the addon preferences are not available
+    DEFAULT_CACHE_SIZE_MB = 4096
 
     @classmethod
-    def _save_to_temp_file(cls, image):
+    def _get_key(cls, image):
         # Note: We can't use utils.make_key(image) here because the memory address
         # might be re-used on undo, causing a key collision
         if image.filepath_raw:
@@ -19,35 +36,141 @@ class ImageExporter(object):
         else:
             key = image.name
 
-        if key in cls.temp_images:
-            # Image was already exported
-            temp_image = cls.temp_images[key]
+        # A repacked image gets a new packed file, a painted image is dirty
+        packed_file = image.packed_file
+        if image.source == "GENERATED":
+            return key, cls._get_content_hash(image), image.is_dirty
+        if packed_file:
+            return key, packed_file.as_pointer(), packed_file.size, image.is_dirty
+        return key, image.is_dirty
+
+    @classmethod
+    def _get_extension(cls, image):
+        if image.filepath_raw and image.source != "GENERATED":
+            _, extension = os.path.splitext(image.filepath_raw)
+            if extension:
+                return extension.lower()
+        # Generated images do not have a filepath, fallback to file_format
+        return "." + image.file_format.lower()
+
+    @classmethod
+    def _get_content_hash(cls, image):
+        hasher = hashlib.sha1()
+
+        if image.source == "GENERATED":
+            params = (image.generated_type, image.generated_width, image.generated_height,
+                      tuple(image.generated_color), image.use_generated_float, image.file_format,
+                      image.colorspace_settings.name, image.alpha_mode)
+            hasher.update(("generated" + str(params)).encode())
         else:
-            if image.filepath_raw:
-                _, extension = os.path.splitext(image.filepath_raw)
-            else:
-                # Generated images do not have a filepath, fallback to file_format
-                extension = "." + image.file_format.lower()
+            hasher.update(image.packed_file.data)
 
-            temp_image = tempfile.NamedTemporaryFile(delete=False, suffix=extension)
+        return hasher.hexdigest()
 
-            print('Unpacking image "%s" to temp file "%s"' % (image.name, temp_image.name))
-            orig_filepath = image.filepath_raw
-            orig_source = image.source
-            image.filepath_raw = temp_image.name
+    @classmethod
+    def _save_to_temp_file(cls, image):
+        key = cls._get_key(image)
 
-            try:
-                image.save()
-            except RuntimeError as error:
-                raise OSError(str(error))
-            finally:
-                # The changes above altered the source to "FILE", so we have to restore the original source
-                image.filepath_raw = orig_filepath
-                image.source = orig_source
+        if key in cls.cached_images:
+            # Image was already exported
+            return cls.cached_images[key]
+        if key in cls.temp_images:
+            return cls.temp_images[key].name
 
+        if image.is_dirty:
+            # The packed data or generated parameters do not describe the pixels of
+            # images with unsaved changes (e.g. after painting), they have to be re-encoded
+            temp_image = tempfile.NamedTemporaryFile(delete=False, suffix=cls._get_extension(image))
+            temp_image.close()
+            print('Saving image "%s" with unsaved changes to temp file "%s"' % (image.name, temp_image.name))
+            cls._save_image(image, temp_image.name)
             # Only store the key once we are sure that everything went OK
             cls.temp_images[key] = temp_image
-        return temp_image.name
+            return temp_image.name
+
+        filepath = os.path.join(cls.CACHE_DIR, cls._get_content_hash(image) + cls._get_extension(image))
+
+        if os.path.isfile(filepath):
+            print('Using cached image "%s" for image "%s"' % (filepath, image.name))
+            # Mark as recently used for the size limit
+            os.utime(filepath)
+        else:
+            os.makedirs(cls.CACHE_DIR, exist_ok=True)
+            # Write to a temporary name first, so an interrupted write never leaves a corrupt cache entry
+            partial_filepath = "%s.%d.partial%s" % (filepath, os.getpid(), cls._get_extension(image))
+
+            if image.source != "GENERATED":
+                print('Unpacking image "%s" to cache file "%s"' % (image.name, filepath))
+                # The packed data is the original file, it can be written without re-encoding
+                with open(partial_filepath, "wb") as f:
+                    f.write(image.packed_file.data)
+            else:
+                print('Saving generated image "%s" to cache file "%s"' % (image.name, filepath))
+                cls._save_image(image, partial_filepath)
+
+            os.replace(partial_filepath, filepath)
+
+        # Only store the key once we are sure that everything went OK
+        cls.cached_images[key] = filepath
+        cls._enforce_cache_size()
+        return filepath
+
+    @classmethod
+    def _save_image(cls, image, filepath):
+        orig_filepath = image.filepath_raw
+        orig_source = image.source
+        image.filepath_raw = filepath
+
+        try:
+            image.save()
+        except RuntimeError as error:
+            raise OSError(str(error))
+        finally:
+            # The changes above altered the source to "FILE", so we have to restore the original source
+            image.filepath_raw = orig_filepath
+            image.source = orig_source
+
+    @classmethod
+    def _get_cache_size_limit(cls):
+        try:
+            size_mb = utils.get_addon_preferences(bpy.context).image_cache_size
+        except (AttributeError, KeyError):
+            size_mb = cls.DEFAULT_CACHE_SIZE_MB
+        return size_mb * 1024 * 1024
+
+    @classmethod
+    def _enforce_cache_size(cls):
+        """ Deletes the least recently used cache files until the cache fits into the size limit """
+        entries = []
+        total_size = 0
+
+        with os.scandir(cls.CACHE_DIR) as it:
+            for entry in it:
+                if not entry.is_file() or ".partial" in entry.name:
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total_size += stat.st_size
+
+        size_limit = cls._get_cache_size_limit()
+        if total_size <= size_limit:
+            return
+
+        in_use = set(cls.cached_images.values())
+
+        for _, size, filepath in sorted(entries):
+            if total_size <= size_limit:
+                break
+            if filepath in in_use:
+                continue
+
+            try:
+                os.remove(filepath)
+                total_size -= size
+                print("Removed image from cache:", filepath)
+            except OSError:
+                # Might be used by another Blender instance
+                pass
 
     @classmethod
     def export(cls, image, image_user, scene):
@@ -106,6 +229,9 @@ class ImageExporter(object):
 
     @classmethod
     def cleanup(cls):
+        # Files in the cache directory are kept for later sessions
+        cls.cached_images.clear()
+
         for temp_image in cls.temp_images.values():
             filepath = temp_image.name
             temp_image.close()
@@ -114,3 +240,137 @@ class ImageExporter(object):
 
         cls.temp_images.clear()
 
+
+
+class TextureProxyCache(object):
+    """
+    This class is a singleton.
+    Builds downscaled copies of image textures for viewport renders in background threads,
+    so the viewport does not have to wait until LuxCore has loaded the full resolution images.
+    The proxies are stored on disk, keyed by source path, modification time and target size,
+    so they are re-used by later sessions. Final renders always use the original images.
+    """
+    CACHE_DIR = os.path.join(tempfile.gettempdir(), "BlendLuxCore_texture_proxies")
+    # {(filepath, max_size): (mtime_ns, proxy_filepath)}
+    proxies = {}
+    # {(filepath, max_size): Future}
+    jobs = {}
+    # Reentrant because job callbacks might be executed immediately in the submitting thread
+    lock = threading.RLock()
+    executor = None
+
+    @classmethod
+    def is_available(cls):
+        return oiio is not None
+
+    @classmethod
+    def get_max_size(cls, exporter):
+        """ Returns the proxy size used by this export, or 0 if the original images are used """
+        if not exporter.is_viewport_render or not cls.is_available():
+            return 0
+        viewport = exporter.scene.luxcore.viewport
+        return int(viewport.texture_proxy_size) if viewport.use_texture_proxies else 0
+
+    @classmethod
+    def get(cls, filepath, max_size):
+        """
+        Returns the filepath of the proxy, or None if it is not built yet.
+        In this case, a background job is started to build it.
+        """
+        key = (filepath, max_size)
+
+        try:
+            mtime_ns = os.stat(filepath).st_mtime_ns
+        except OSError:
+            return filepath
+
+        with cls.lock:
+            entry = cls.proxies.get(key)
+            if entry and entry[0] == mtime_ns:
+                return entry[1]
+            if key in cls.jobs:
+                return None
+
+            hasher = hashlib.sha1(f"{filepath}{mtime_ns}{max_size}".encode())
+            _, extension = os.path.splitext(filepath)
+            proxy_filepath = os.path.join(cls.CACHE_DIR, hasher.hexdigest() + extension.lower())
+
+            if os.path.isfile(proxy_filepath):
+                # Built in an earlier session
+                cls.proxies[key] = (mtime_ns, proxy_filepath)
+                return proxy_filepath
+
+            if cls.executor is None:
+                cls.executor = ThreadPoolExecutor(max_workers=max(1, (os.cpu_count() or 2) // 2),
+                                                  thread_name_prefix="BlendLuxCore_TextureProxy")
+            print('Building texture proxy for "%s"' % filepath)
+            future = cls.executor.submit(_build_proxy, filepath, proxy_filepath, max_size)
+            cls.jobs[key] = future
+            future.add_done_callback(lambda f: cls._job_done(key, mtime_ns, f))
+            return None
+
+    @classmethod
+    def is_pending(cls, filepath, max_size):
+        return (filepath, max_size) in cls.jobs
+
+    @classmethod
+    def _job_done(cls, key, mtime_ns, future):
+        # Executed in a worker thread
+        with cls.lock:
+            del cls.jobs[key]
+            try:
+                cls.proxies[key] = (mtime_ns, future.result())
+            except Exception as error:
+                print('Could not build texture proxy for "%s": %s' % (key[0], error))
+                # Use the original image instead
+                cls.proxies[key] = (mtime_ns, key[0])
+
+    @classmethod
+    def cleanup(cls):
+        # Files in the cache directory are kept for later sessions
+        if cls.executor is not None:
+            cls.executor.shutdown(wait=False, cancel_futures=True)
+            cls.executor = None
+
+
+def _build_proxy(filepath, proxy_filepath, max_size):
+    # Executed in a worker thread. OpenImageIO releases the GIL while decoding and resizing.
+    image_input = oiio.ImageInput.open(filepath)
+    if image_input is None:
+        raise OSError(oiio.geterror())
+
+    # If the file contains MIP levels (e.g. a .tx file), read the smallest one that is still large enough
+    miplevel = 0
+    while image_input.seek_subimage(0, miplevel + 1):
+        spec = image_input.spec()
+        if max(spec.width, spec.height) < max_size:
+            break
+        miplevel += 1
+    image_input.close()
+
+    buf = oiio.ImageBuf(filepath, 0, miplevel)
+    spec = buf.spec()
+    largest_side = max(spec.width, spec.height)
+
+    if largest_side <= max_size:
+        if miplevel == 0:
+            # Already small enough
+            return filepath
+        resized = buf
+    else:
+        scale = max_size / largest_side
+        roi = oiio.ROI(0, max(1, round(spec.width * scale)), 0, max(1, round(spec.height * scale)),
+                       0, 1, 0, spec.nchannels)
+        resized = oiio.ImageBufAlgo.resize(buf, roi=roi)
+
+    if resized.has_error:
+        raise OSError(resized.geterror())
+
+    os.makedirs(os.path.dirname(proxy_filepath), exist_ok=True)
+    # Write to a temporary name first, so an interrupted write never leaves a corrupt proxy
+    base, extension = os.path.splitext(proxy_filepath)
+    partial_filepath = "%s.%d.partial%s" % (base, os.getpid(), extension)
+    if not resized.write(partial_filepath):
+        raise OSError(resized.geterror())
+    os.replace(partial_filepath, proxy_filepath)
+    return proxy_filepath
@@ -8,6 +8,7 @@ from .image import ImageExporter
 from ..utils.errorlog import LuxCoreErrorLog
 from ..utils import node as utils_node
 from ..nodes.output import get_active_output
+from ..handlers import frame_change_pre
 
 WORLD_BACKGROUND_LIGHT_NAME = "__WORLD_BACKGROUND_LIGHT__"
 MISSING_IMAGE_COLOR = [1, 0, 1]
@@ -26,6 +27,8 @@ def convert_light(exporter, obj, obj_key, depsgraph, luxcore_scene, transform, i
 
         prefix = "scene.lights." + luxcore_name + "."
 
+        frame_change_pre.update_user(obj.data, _uses_time_dependent_content(exporter, obj.data))
+
         if obj.data.luxcore.use_cycles_settings:
             return _convert_cycles_light(exporter, obj, depsgraph, luxcore_scene, transform, is_viewport_render,
                                          luxcore_name, scene, prefix)
@@ -362,6 +365,8 @@ def convert_world(exporter, world, scene, is_viewport_render):
         luxcore_name = WORLD_BACKGROUND_LIGHT_NAME
         prefix = "scene.lights." + luxcore_name + "."
 
+        frame_change_pre.update_user(world, _uses_time_dependent_content(exporter, world))
+
         if world.luxcore.use_cycles_settings:
             definitions = _convert_cycles_world(exporter, scene, world, is_viewport_render)
         else:
@@ -588,6 +593,24 @@ def _convert_common_props(exporter, scene, light_or_world):
     return gain, importance, lightgroup_id
 
 
+def _uses_time_dependent_content(exporter, light_or_world):
+    """
+    Returns True if the light or world has to be updated on frame changes
+    (image sequences, or node trees with time dependent nodes)
+    """
+    settings = light_or_world.luxcore
+    node_trees = [settings.volume]
+
+    if not settings.use_cycles_settings:
+        if settings.image and settings.image.source == "SEQUENCE":
+            return True
+        if isinstance(light_or_world, bpy.types.Light):
+            node_trees.append(settings.node_tree)
+
+    return any(node_tree and frame_change_pre.node_tree_is_time_dependent(exporter, node_tree)
+               for node_tree in node_trees)
+
+
 def _convert_infinite(definitions, light_or_world, scene, transformation=None):
     assert light_or_world.luxcore.image is not None
 
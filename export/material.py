@@ -1,14 +1,65 @@
+from collections import OrderedDict
 import pyluxcore
 from .. import utils
 from ..utils import node as utils_node
 from ..nodes.output import get_active_output
 from ..utils.errorlog import LuxCoreErrorLog
+from ..handlers import frame_change_pre
 from . import cycles_node_reader
+from .image import TextureProxyCache
 
 
 GLOBAL_FALLBACK_MAT = "__CLAY__"
 
 
+class MaterialPropsCache:
+    """
+    This class is a singleton.
+    Stores the exported props of materials by node tree fingerprint, so unchanged
+    materials don't have to be converted again on session restarts and re-exports.
+    """
+    MAX_ENTRIES = 512
+    # {(fingerprint, luxcore_name, lightgroup names): (props, lightgroup_ids)}
+    entries = OrderedDict()
+    # {material name: [hits, misses]}
+    material_stats = {}
+
+    @classmethod
+    def get(cls, key):
+        entry = cls.entries.get(key)
+        if entry is not None:
+            cls.entries.move_to_end(key)
+        return entry
+
+    @classmethod
+    def store(cls, key, props, lightgroup_ids):
+        cached_props = pyluxcore.Properties()
+        cached_props.Set(props)
+        cls.entries[key] = (cached_props, lightgroup_ids)
+        cls.entries.move_to_end(key)
+
+        while len(cls.entries) > cls.MAX_ENTRIES:
+            cls.entries.popitem(last=False)
+
+    @classmethod
+    def count(cls, exporter, material, is_hit):
+        material_stats = cls.material_stats.setdefault(material.name_full, [0, 0])
+        material_stats[0 if is_hit else 1] += 1
+
+        if exporter.stats:
+            hits, misses = exporter.stats.material_cache.value
+            if is_hit:
+                hits += 1
+            else:
+                misses += 1
+            exporter.stats.material_cache.value = (hits, misses)
+
+    @classmethod
+    def clear(cls):
+        cls.entries.clear()
+        cls.material_stats.clear()
+
+
 def convert(exporter, depsgraph, material, is_viewport_render, obj_name=""):
     try:
         if material is None:
@@ -23,7 +74,19 @@ def convert(exporter, depsgraph, material, is_viewport_render, obj_name=""):
         is_asset_without_lux_mat = node_tree is None and material.library
         
         if material.use_nodes and (material.luxcore.use_cycles_nodes or is_asset_without_lux_mat):
-            return cycles_node_reader.convert(material, props, luxcore_name, obj_name)
+            # The same material is usually requested by many objects during one export
+            cache_key = (utils.make_key(material), luxcore_name)
+            cached_props = exporter.cycles_material_cache.get(cache_key)
+            if cached_props:
+                props.Set(cached_props)
+                return luxcore_name, props
+
+            warning_count = LuxCoreErrorLog.get_count()
+            luxcore_name, props = cycles_node_reader.convert(material, props, luxcore_name, obj_name)
+            # Warnings of unsupported nodes have to be reported for every object
+            if LuxCoreErrorLog.get_count() == warning_count:
+                exporter.cycles_material_cache[cache_key] = props
+            return luxcore_name, props
 
         if node_tree is None:
             LuxCoreErrorLog.add_warning(f'Material "{material.name}": Missing node tree', obj_name=obj_name)
@@ -39,8 +102,50 @@ def convert(exporter, depsgraph, material, is_viewport_render, obj_name=""):
             msg = f'Material "{material.name}": Combining volumes and materials with opacity < 1 can lead to artifacts!'
             LuxCoreErrorLog.add_warning(msg, obj_name=obj_name)
 
-        # Now export the material node tree, starting at the output node
-        active_output.export(exporter, depsgraph, props, luxcore_name)
+        frame_change_pre.update_user(material, frame_change_pre.node_tree_is_time_dependent(exporter, node_tree))
+
+        fingerprint, is_time_dependent = utils_node.get_node_tree_fingerprint(exporter, node_tree)
+        lightgroup_names = tuple(group.name for group in exporter.scene.luxcore.lightgroups.custom)
+        cache_key = (fingerprint, luxcore_name, lightgroup_names, TextureProxyCache.get_max_size(exporter))
+        # Time dependent trees get a new fingerprint on every frame and can contain large
+        # volume grids (smoke, OpenVDB), caching them would keep the grids of all frames in memory
+        cache_entry = None if is_time_dependent else MaterialPropsCache.get(cache_key)
+
+        if cache_entry:
+            cached_props, lightgroup_ids = cache_entry
+            props.Set(cached_props)
+            exporter.lightgroup_cache.update(lightgroup_ids)
+            MaterialPropsCache.count(exporter, material, True)
+            return luxcore_name, props
+
+        # Collect the lightgroups used by this material separately, they are stored in the cache entry
+        exporter_lightgroup_cache = exporter.lightgroup_cache
+        exporter_pending_texture_proxies = exporter.pending_texture_proxies
+        exporter.lightgroup_cache = set()
+        exporter.pending_texture_proxies = set()
+        warning_count = LuxCoreErrorLog.get_count()
+        try:
+            # Now export the material node tree, starting at the output node
+            active_output.export(exporter, depsgraph, props, luxcore_name)
+        finally:
+            lightgroup_ids = exporter.lightgroup_cache
+            pending_texture_proxies = exporter.pending_texture_proxies
+            exporter.lightgroup_cache = exporter_lightgroup_cache
+            exporter.pending_texture_proxies = exporter_pending_texture_proxies
+            exporter.lightgroup_cache.update(lightgroup_ids)
+            if exporter.pending_texture_proxies is not None:
+                exporter.pending_texture_proxies.update(pending_texture_proxies)
+
+        if pending_texture_proxies:
+            # The material uses placeholders, it is exported again when the texture proxies are done
+            library = material.original.library
+            material_key = (material.original.name, library.filepath if library else None)
+            exporter.texture_proxy_users[material_key] = pending_texture_proxies
+
+        # Don't cache materials with export problems, their warnings have to be reported on every export
+        if LuxCoreErrorLog.get_count() == warning_count and not pending_texture_proxies and not is_time_dependent:
+            MaterialPropsCache.store(cache_key, props, lightgroup_ids)
+        MaterialPropsCache.count(exporter, material, False)
 
         return luxcore_name, props
     except Exception as error:
@@ -1,10 +1,62 @@
 import bpy
+import hashlib
+import os
+from collections import OrderedDict
 from time import time
+import numpy as np
 from .. import utils
-import array
+from ..utils import node as utils_node
 
 
-def convert(smoke_obj, channel, depsgraph):
+class SmokeGridCache:
+    """
+    This class is a singleton.
+    Stores converted smoke grids of viewport renders, so grids that did not change
+    (e.g. when a material is edited) don't have to be read again.
+    Final renders read each grid once per frame and don't use the cache.
+    """
+    # Least recently used grids are removed when the cache grows larger than this
+    MAX_BYTES = 1024 ** 3
+    # {(domain, channel, frame, resolution, settings hash, cache files, downsampling): (resolution, grid)}
+    entries = OrderedDict()
+    size_bytes = 0
+
+    @classmethod
+    def get(cls, key):
+        entry = cls.entries.get(key)
+        if entry is not None:
+            cls.entries.move_to_end(key)
+        return entry
+
+    @classmethod
+    def store(cls, key, resolution, grid):
+        if key in cls.entries:
+            cls.size_bytes -= cls.entries.pop(key)[1].nbytes
+
+        if grid.nbytes > cls.MAX_BYTES:
+            # Would evict everything else
+            return
+
+        cls.entries[key] = (resolution, grid)
+        cls.size_bytes += grid.nbytes
+
+        while cls.size_bytes > cls.MAX_BYTES:
+            _, (_, evicted_grid) = cls.entries.popitem(last=False)
+            cls.size_bytes -= evicted_grid.nbytes
+
+    @classmethod
+    def clear(cls):
+        cls.entries.clear()
+        cls.size_bytes = 0
+
+
+def convert(smoke_obj, channel, depsgraph, downsampling=1, use_cache=False):
+    """
+    Returns the resolution and the grid of a channel as flat float32 NumPy array.
+    If downsampling is greater than 1, the grid resolution is divided by this factor
+    along each axis (used to speed up viewport renders of large simulations).
+    If use_cache is True, the grid is looked up in and stored to the SmokeGridCache.
+    """
     start = time()
 
     smoke_domain_mod = utils.find_smoke_domain_modifier(smoke_obj)
@@ -30,15 +82,6 @@ def convert(smoke_obj, channel, depsgraph):
     else:
         raise NotImplementedError("Unknown channel type " + channel)
 
-    # Prevent a crash
-    if len(grid) == 0:
-        msg = 'Object "%s": No smoke data (simulate some frames first)' % smoke_obj.name
-        raise Exception(msg)
-
-    # We have to convert Blender's bpy_prop_array because it doesn't support the Python buffer interface.
-    # We use an array instead of a list here to save a lot of memory (list would use doubles instead of floats).
-    channeldata = array.array("f", grid)
-
     # The smoke resolution along the x, y, z axis
     resolution = list(settings.domain_resolution)
 
@@ -50,6 +93,81 @@ def convert(smoke_obj, channel, depsgraph):
         if settings.use_noise:
             resolution = [res * settings.noise_scale for res in resolution]
 
+    if use_cache:
+        # The domain settings are part of the key because the simulation of
+        # a frame changes when they are edited (e.g. in replay cache mode)
+        settings_hasher = hashlib.md5()
+        utils_node.update_hash_from_struct(settings_hasher, settings, depsgraph.scene_eval)
+        # The cache files change when the simulation is baked again.
+        # Edits of flow objects (which change unbaked simulations) clear the cache, see depsgraph_update_post.
+        frame = depsgraph.scene_eval.frame_current
+        key = (smoke_obj.original.name_full, channel, frame, tuple(resolution),
+               settings_hasher.hexdigest(), _get_cache_files_state(settings, frame), downsampling)
+        cached = SmokeGridCache.get(key)
+        if cached:
+            return cached
+
+    # Prevent a crash
+    if len(grid) == 0:
+        msg = 'Object "%s": No smoke data (simulate some frames first)' % smoke_obj.name
+        raise Exception(msg)
+
+    # Read the grid in one call into a float32 buffer that can be passed to LuxCore without further copies
+    channeldata = np.empty(len(grid), dtype=np.float32)
+    grid.foreach_get(channeldata)
+
+    if downsampling > 1:
+        resolution, channeldata = _downsample(resolution, channeldata, downsampling)
+
     print("conversion to array took %.3f s" % (time() - start))
 
+    if use_cache:
+        SmokeGridCache.store(key, resolution, channeldata)
     return resolution, channeldata
+
+
+def _get_cache_files_state(settings, frame):
+    """
+    Names, sizes and modification times of the bake files of a frame.
+    The directory listings are cached by utils.SequenceIndex and only scanned
+    again when the directory changes (e.g. when the simulation is baked again).
+    """
+    cache_directory = getattr(settings, "cache_directory", "")
+    if not cache_directory:
+        return ()
+
+    directory = bpy.path.abspath(cache_directory)
+    frame_str = "_%04d." % frame
+
+    def parse(files):
+        frame_state = []
+        for name, path in files:
+            if frame_str in name:
+                stat = os.stat(path)
+                frame_state.append((name, stat.st_size, stat.st_mtime_ns))
+        return tuple(sorted(frame_state))
+
+    state = ()
+    for subdirectory in ("data", "noise"):
+        try:
+            state += utils.SequenceIndex.get(os.path.join(directory, subdirectory), ("smoke", frame), parse)
+        except OSError:
+            continue
+
+    return state
+
+
+def _downsample(resolution, channeldata, factor):
+    nx, ny, nz = resolution
+    channels = len(channeldata) // (nx * ny * nz)
+    # Blender stores the voxels with x as the fastest changing index
+    voxels = channeldata.reshape(nz, ny, nx, channels)
+
+    new_resolution = [max(1, res // factor) for res in resolution]
+    new_nx, new_ny, new_nz = new_resolution
+    factor_x, factor_y, factor_z = [min(factor, res) for res in resolution]
+    # Voxels that don't fill a complete block at the far end are dropped
+    voxels = voxels[:new_nz * factor_z, :new_ny * factor_y, :new_nx * factor_x]
+    voxels = voxels.reshape(new_nz, factor_z, new_ny, factor_y, new_nx, factor_x, channels)
+    voxels = voxels.mean(axis=(1, 3, 5), dtype=np.float32)
+    return new_resolution, np.ascontiguousarray(voxels, dtype=np.float32).ravel()
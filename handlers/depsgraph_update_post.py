@@ -1,11 +1,40 @@
 import bpy
 from bpy.app.handlers import persistent
 
+
 @persistent
-def handler(scene):
+def handler(scene, depsgraph):
+    if depsgraph.id_type_updated("OBJECT"):
+        _check_fluid_objects(depsgraph)
+
     # If material name was changed, rename the node tree, too.
-    for mat in bpy.data.materials:
+    # Only the updated materials are checked, so the cost does not depend on the number of materials in the file.
+    if not depsgraph.id_type_updated("MATERIAL"):
+        return
+
+    for dg_update in depsgraph.updates:
+        if not isinstance(dg_update.id, bpy.types.Material):
+            continue
+
+        mat = dg_update.id.original
         node_tree = mat.luxcore.node_tree
 
         if node_tree and node_tree.name != mat.name:
             node_tree.name = mat.name
+
+
+def _check_fluid_objects(depsgraph):
+    # Edits of flow and effector objects change unbaked simulations without changing
+    # the domain settings, so cached smoke grids can't be trusted anymore
+    # Import here, the handler module is loaded at registration time
+    from ..export.smoke import SmokeGridCache
+    if not SmokeGridCache.entries:
+        return
+
+    for dg_update in depsgraph.updates:
+        obj = dg_update.id
+        if not isinstance(obj, bpy.types.Object):
+            continue
+        if any(mod.type == "FLUID" and mod.fluid_type in {"FLOW", "EFFECTOR"} for mod in obj.modifiers):
+            SmokeGridCache.clear()
+            return
@@ -1,4 +1,4 @@
-from ..export.image import ImageExporter
+from ..export.image import ImageExporter, TextureProxyCache
 from ..draw.viewport import TempfileManager
 from ..nodes.volumes import grin
 import pyluxcore
@@ -6,6 +6,7 @@ import pyluxcore
 
 def handler():
     ImageExporter.cleanup()
+    TextureProxyCache.cleanup()
     TempfileManager.cleanup()
     grin.cleanup_preview_images()
     
@@ -1,52 +1,74 @@
 import bpy
 from bpy.app.handlers import persistent
 from ..utils import node as utils_node
-from ..utils import openVDB_sequence_resolve_all
-from ..utils import clamp
 
-RELEVANT_NODES = {"LuxCoreNodeTexImagemap", "LuxCoreNodeTexOpenVDB", "LuxCoreNodeTexTimeInfo"}
+# Reverse index of the datablocks (materials, lights, worlds) that use time dependent content:
+# image sequences, OpenVDB files or time info nodes. Only these users are updated on frame changes.
+# Maintained during export (every export and viewport update of a user re-evaluates its entry),
+# entries of deleted or renamed users are dropped by the handler. Cleared when a new .blend is loaded.
+# Keys are (bpy.data collection name, name, library filepath) to avoid holding references to datablocks.
+time_dependent_users = set()
+
+_COLLECTION_NAMES = {
+    bpy.types.Material: "materials",
+    bpy.types.Light: "lights",
+    bpy.types.World: "worlds",
+}
+
+
+def _make_key(datablock):
+    datablock = datablock.original
+    library = datablock.library.filepath if datablock.library else None
+    collection_name = next(name for id_type, name in _COLLECTION_NAMES.items() if isinstance(datablock, id_type))
+    return collection_name, datablock.name, library
+
+
+def update_user(datablock, is_time_dependent):
+    """
+    Adds the datablock to the index if it uses time dependent content, removes it otherwise.
+    Called by the exporters of materials, lights and worlds.
+    """
+    key = _make_key(datablock)
+    if is_time_dependent:
+        time_dependent_users.add(key)
+    else:
+        time_dependent_users.discard(key)
+
+
+def is_time_dependent_user(datablock):
+    return _make_key(datablock) in time_dependent_users
+
+
+def node_tree_is_time_dependent(exporter, node_tree):
+    features = utils_node.get_node_tree_features(node_tree, exporter.node_tree_features)
+    return features.image_sequence or features.openvdb or features.time_info
+
+
+def _force_update(collection_name, datablock):
+    # Re-assigning a property flags the datablock as updated, which triggers a viewport update.
+    # Note that users of edited node trees are not flagged as updated by Blender, and node trees
+    # which are not shown in any node editor can't be flagged directly (Blender bug/limitation).
+    if collection_name == "materials":
+        datablock.diffuse_color = datablock.diffuse_color
+    else:
+        datablock.color = datablock.color
 
-# Flags that save us from having to iterate all node trees when no related nodes are used (the common case).
-# Set in relevant node export methods, reset when new .blend is loaded in load_post.
-have_to_check_node_trees = False
 
 # Important: Since this function is executed on every frame, even milliseconds of processin time in here will
 # bring down the frame rate of animations considerably. Always assume the worst case: A big scene with many
 # materials and complex node trees, and optimize for it.
 @persistent
 def handler(scene):
-    global have_to_check_node_trees
-
-    if not have_to_check_node_trees or scene.render.engine != "LUXCORE":
+    if not time_dependent_users or scene.render.engine != "LUXCORE":
         return
 
-    found_relevant_node = False
-    for mat in bpy.data.materials:
-        if not mat.luxcore.node_tree:
+    for key in list(time_dependent_users):
+        collection_name, name, library = key
+        datablock = getattr(bpy.data, collection_name).get((name, library))
+
+        if datablock is None:
+            # Deleted or renamed, a renamed user is added again when it is exported
+            time_dependent_users.discard(key)
             continue
 
-        if utils_node.has_nodes_multi(mat.luxcore.node_tree, RELEVANT_NODES, True):
-            found_relevant_node = True
-            # Force a viewport update
-            mat.diffuse_color = mat.diffuse_color
-
-    have_to_check_node_trees = found_relevant_node
-
-    # TODO we are not handling area lights with image sequence textures right now
-    #  because I can't think of a check with good performance in large scenes.
-
-
-    # This is what I would like to do, but it does not work if the node tree is not selected in any node editor.
-    # Also, users of edited node trees are not flagged as updated (e.g. materials, area lights, camera) which
-    # is a Blender bug/limitation.
-    #
-    # from ..nodes import TREE_TYPES
-    # for node_tree in bpy.data.node_groups:
-    #     if node_tree.bl_idname not in TREE_TYPES:
-    #         continue
-    #
-    #     for node in utils_node.find_nodes(node_tree, "LuxCoreNodeTexImagemap"):
-    #         if node.image and node.image.source == "SEQUENCE":
-    #             # Force a viewport update
-    #             node.image = node.image
-    #             # node_tree.update_tag()  # Does not work
+        _force_update(collection_name, datablock)
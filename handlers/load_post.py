@@ -7,6 +7,8 @@ from .. import utils
 from ..utils import compatibility
 from . import frame_change_pre
 from ..utils.errorlog import LuxCoreErrorLog
+from ..export.material import MaterialPropsCache
+from ..export.smoke import SmokeGridCache
 from ..operators.manual_compatibility import LUXCORE_OT_convert_to_v23
 
 
@@ -83,7 +85,11 @@ def handler(_):
     # Run converters for backwards compatibility
     compatibility.run()
 
-    frame_change_pre.have_to_check_node_trees = False
+    frame_change_pre.time_dependent_users.clear()
+    # Memory addresses of the new file's node trees might collide with cached ones
+    MaterialPropsCache.clear()
+    SmokeGridCache.clear()
+    utils.SequenceIndex.refresh()
     LuxCoreErrorLog.clear()
 
     # After loading a .blend file, make it possible to execute the conversion operator again
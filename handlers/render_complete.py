@@ -0,0 +1,10 @@
+from bpy.app.handlers import persistent
+
+
+@persistent
+def handler(scene, *args):
+    """ Also registered as render_cancel handler """
+    # The session of an animation render is kept alive between frames. Make sure it is
+    # stopped when the render ends, e.g. if it was cancelled in between two frames.
+    from ..engine.final import PersistentAnimationSession
+    PersistentAnimationSession.stop()
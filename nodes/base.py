@@ -1,10 +1,12 @@
 import bpy
+import pyluxcore
 from bpy.props import PointerProperty, EnumProperty
 from mathutils import Color
 from .. import utils
 from ..utils import node as utils_node
 from ..utils import ui as utils_ui
 from ..ui import icons
+from ..utils.errorlog import LuxCoreErrorLog
 from . import TREE_TYPES, TREE_ICONS
 
 class LuxCoreNodeTree:
@@ -389,7 +391,52 @@ class LuxCoreNodeTreePointer(LuxCoreNode, bpy.types.Node):
         # different shader instances for different sets of input parameters)
         luxcore_name = utils.get_luxcore_name(self.node_tree)
 
-        output.export(exporter, depsgraph, props, luxcore_name)
+        # The referenced node tree is converted only once per export and shared by all users.
+        # Its props are still added to every user, so the exported props of each material stay
+        # self-contained (setting the same texture definitions again is cheap).
+        fingerprint, _ = utils_node.get_node_tree_fingerprint(exporter, self.node_tree)
+        # Texture proxies are only used in materials, the props of other users reference the original images
+        uses_texture_proxies = exporter.pending_texture_proxies is not None
+        cache_key = (utils.make_key(self.node_tree), luxcore_name, uses_texture_proxies)
+        cache_entry = exporter.shared_node_cache.get(cache_key)
+
+        if cache_entry and cache_entry[0] == fingerprint:
+            _, tree_props, lightgroup_ids = cache_entry
+            props.Set(tree_props)
+            exporter.lightgroup_cache.update(lightgroup_ids)
+            return luxcore_name
+
+        tree_props = pyluxcore.Properties()
+        # The output node clears the node cache (it is scoped to one output, see Exporter.__init__),
+        # so the user's cache has to be restored afterwards.
+        # Lightgroups and pending texture proxies are collected separately so they can be checked afterwards.
+        user_node_cache = exporter.node_cache
+        user_lightgroup_cache = exporter.lightgroup_cache
+        user_pending_texture_proxies = exporter.pending_texture_proxies
+        exporter.node_cache = {}
+        exporter.lightgroup_cache = set()
+        exporter.pending_texture_proxies = set() if uses_texture_proxies else None
+        warning_count = LuxCoreErrorLog.get_count()
+        try:
+            output.export(exporter, depsgraph, tree_props, luxcore_name)
+        finally:
+            lightgroup_ids = exporter.lightgroup_cache
+            pending_texture_proxies = exporter.pending_texture_proxies
+            exporter.node_cache = user_node_cache
+            exporter.lightgroup_cache = user_lightgroup_cache
+            exporter.pending_texture_proxies = user_pending_texture_proxies
+            exporter.lightgroup_cache.update(lightgroup_ids)
+            if uses_texture_proxies:
+                exporter.pending_texture_proxies.update(pending_texture_proxies)
+
+        # Don't share node trees with export problems, their warnings have to be reported for every user.
+        # Node trees with texture placeholders are exported again when the texture proxies are done.
+        if LuxCoreErrorLog.get_count() == warning_count and not pending_texture_proxies:
+            exporter.shared_node_cache[cache_key] = (fingerprint, tree_props, lightgroup_ids)
+        else:
+            exporter.shared_node_cache.pop(cache_key, None)
+
+        props.Set(tree_props)
         return luxcore_name
 
 
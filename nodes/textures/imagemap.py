@@ -4,13 +4,12 @@ from bpy.props import (
     BoolProperty, FloatProperty,
 )
 from ..base import LuxCoreNodeTexture
-from ...export.image import ImageExporter
+from ...export.image import ImageExporter, TextureProxyCache
 from ...properties.image_user import LuxCoreImageUser
 from ... import utils
 from ...utils import node as utils_node
 from ...utils.errorlog import LuxCoreErrorLog
 from ...ui import icons
-from ...handlers import frame_change_pre
 
 
 NORMAL_MAP_DESC = (
@@ -177,9 +176,6 @@ class LuxCoreNodeTexImagemap(LuxCoreNodeTexture, bpy.types.Node):
             else:
                 return [0, 0, 0]
 
-        if self.image.source == "SEQUENCE":
-            frame_change_pre.have_to_check_node_trees = True
-
         try:
             filepath = ImageExporter.export(self.image, self.image_user, exporter.scene)
         except OSError as error:
@@ -187,6 +183,21 @@ class LuxCoreNodeTexImagemap(LuxCoreNodeTexture, bpy.types.Node):
             LuxCoreErrorLog.add_warning(msg)
             return [1, 0, 1]
 
+        # Placeholders are only replaced in materials (see material.convert()),
+        # other node trees like world and light textures always use the original image
+        if exporter.pending_texture_proxies is not None:
+            proxy_size = TextureProxyCache.get_max_size(exporter)
+        else:
+            proxy_size = 0
+
+        if proxy_size:
+            proxy_filepath = TextureProxyCache.get(filepath, proxy_size)
+            if proxy_filepath is None:
+                # Use a neutral placeholder until the proxy is built, the material is updated afterwards
+                exporter.pending_texture_proxies.add((filepath, proxy_size))
+                return [0.5, 0.5, 1.0] if self.is_normal_map else [0.5, 0.5, 0.5]
+            filepath = proxy_filepath
+
         definitions = {
             "type": "imagemap",
             "file": filepath,
@@ -40,6 +40,18 @@ class LuxCoreNodeTexSmoke(LuxCoreNodeTexture, bpy.types.Node):
                                          "increases/decreases when more/less bytes are used. Low floating "
                                          "point precision can lead to artifacts when the smoke resolution is low")
 
+    viewport_resolution_items = [
+        ("1", "Full", "Use the full grid resolution in viewport render", 0),
+        ("2", "Half", "Use half the grid resolution along each axis in viewport render (1/8 of the voxels)", 1),
+        ("4", "Quarter", "Use a quarter of the grid resolution along each axis in viewport render "
+                         "(1/64 of the voxels)", 2),
+    ]
+    viewport_resolution: EnumProperty(update=utils_node.force_viewport_update, name="Viewport Resolution",
+                                      items=viewport_resolution_items, default="1",
+                                      description="Reduce the grid resolution in viewport render to speed up "
+                                                  "the export of large simulations. Final renders always use "
+                                                  "the full resolution")
+
     def init(self, context):
         self.outputs.new("LuxCoreSocketFloatPositive", "density")
         self.outputs.new("LuxCoreSocketFloatPositive", "flame")
@@ -59,6 +71,7 @@ class LuxCoreNodeTexSmoke(LuxCoreNodeTexture, bpy.types.Node):
 
         col = layout.column()
         col.prop(self, "precision")
+        col.prop(self, "viewport_resolution")
 
     def sub_export(self, exporter, depsgraph, props, luxcore_name=None, output_socket=None):
         start_time = time()
@@ -97,7 +110,9 @@ class LuxCoreNodeTexSmoke(LuxCoreNodeTexture, bpy.types.Node):
         tex_rot2 = mathutils.Matrix.Rotation(rotate[2], 4, 'Z')
         tex_rot = tex_rot2 @ tex_rot1 @ tex_rot0
 
-        resolution, grid = smoke.convert(domain_eval, output_socket.name, depsgraph)
+        downsampling = int(self.viewport_resolution) if exporter.is_viewport_render else 1
+        resolution, grid = smoke.convert(domain_eval, output_socket.name, depsgraph, downsampling,
+                                         use_cache=exporter.is_viewport_render)
         nx, ny, nz = resolution
 
         smoke_domain_mod = utils.find_smoke_domain_modifier(domain_eval)
@@ -114,7 +129,7 @@ class LuxCoreNodeTexSmoke(LuxCoreNodeTexture, bpy.types.Node):
                 amplify = smoke_domain_mod.domain_settings.amplify + 1
 
         for i in range(3):
-            cell_size[i] = smoke_domain_mod.domain_settings.cell_size[i] * 1/amplify
+            cell_size[i] = smoke_domain_mod.domain_settings.cell_size[i] * downsampling / amplify
 
         # combine transformations
         mapping_type = 'globalmapping3d'
@@ -135,7 +150,8 @@ class LuxCoreNodeTexSmoke(LuxCoreNodeTexture, bpy.types.Node):
 
         luxcore_name = self.create_props(props, definitions, luxcore_name)
         prefix = self.prefix + luxcore_name + "."
-        # We use a fast path (AddAllFloat method) here to transfer the grid data to the properties
+        # We use a fast path (AddAllFloat method) here to transfer the grid data to the properties,
+        # it reads the NumPy buffer directly
 
 
         if output_socket.name == "color":
@@ -150,12 +166,6 @@ class LuxCoreNodeTexSmoke(LuxCoreNodeTexture, bpy.types.Node):
             prop = pyluxcore.Property(prefix + "data", [])
             prop.AddAllFloat(grid)
 
-        # We have to free the memory manually because the grid can be VERY large
-        # and if we don't invoke the garbage collection, we use way more RAM than necessary
-        del grid
-        import gc
-        gc.collect()
-
         props.Set(prop)
 
         elapsed_time = time() - start_time
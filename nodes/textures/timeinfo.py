@@ -1,6 +1,5 @@
 import bpy
 from ..base import LuxCoreNodeTexture
-from ...handlers import frame_change_pre
 
 class LuxCoreNodeTexTimeInfo(LuxCoreNodeTexture, bpy.types.Node):
     """ Access to time and frame information """
@@ -28,7 +27,6 @@ class LuxCoreNodeTexTimeInfo(LuxCoreNodeTexture, bpy.types.Node):
 
     def sub_export(self, exporter, depsgraph, props, luxcore_name=None, output_socket=None):
         scene = depsgraph.scene_eval
-        frame_change_pre.have_to_check_node_trees = True
 
         definitions = {
             "type": "constfloat1",
@@ -70,6 +70,12 @@ SEED_DESC = (
 )
 ANIM_SEED_DESC = "Use different seed values for different frames"
 
+PERSISTENT_ANIM_SESSION_DESC = (
+    "Keep the LuxCore session alive between the frames of an animation render and only update what changed. "
+    "Static meshes and images are not exported again and GPU kernels are not recompiled. "
+    "Not possible with multiple render layers, motion blur or animated seed"
+)
+
 SOBOL_ADAPTIVE_STRENGTH_DESC = (
     "A value of 0 means that each pixel is sampled equally, higher values "
     "focus more samples on noisy areas of the image"
@@ -555,6 +561,10 @@ class LuxCoreConfig(PropertyGroup):
     seed: IntProperty(name="Seed", default=1, min=1, description=SEED_DESC)
     use_animated_seed: BoolProperty(name="Animated Seed", default=False, description=ANIM_SEED_DESC)
 
+    # Animation
+    use_persistent_animation_session: BoolProperty(name="Persistent Animation Session", default=False,
+                                                   description=PERSISTENT_ANIM_SESSION_DESC)
+
     # Min. epsilon settings (drawn in ui/units.py)
     show_min_epsilon: BoolProperty(name="Advanced LuxCore Settings", default=False,
                                     description="Show/Hide advanced LuxCore features. "
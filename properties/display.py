@@ -1,5 +1,5 @@
 import bpy
-from bpy.props import IntProperty, BoolProperty
+from bpy.props import IntProperty, FloatProperty, BoolProperty
 
 
 class LuxCoreDisplaySettings(bpy.types.PropertyGroup):
@@ -8,7 +8,13 @@ class LuxCoreDisplaySettings(bpy.types.PropertyGroup):
     stop_requested = False
 
     interval: IntProperty(name="Refresh Interval (s)", default=10, min=5,
-                           description="Time between film refreshes, in seconds")
+                           description="Time between film refreshes, in seconds. Large images are refreshed "
+                                       "less often if a refresh would take more than the allowed overhead")
+    refresh_overhead: FloatProperty(name="Max. Refresh Overhead (%)", default=2, min=0.1, soft_max=10, max=50,
+                                    precision=1,
+                                    description="Percentage of the render time that may be spent on updating "
+                                                "stats and film. Lower values leave more CPU time to the "
+                                                "render on large images, but delay the refreshes")
 
     show_converged: BoolProperty(name="Highlight Converged Tiles", default=True,
                                   description="Mark tiles that are no longer rendered with green outline")
@@ -48,6 +48,19 @@ VERTEX_COL_MULTIPLIERS_DESC = (
     "from the emitter or texture map, if used"
 )
 
+VIEWPORT_LOD_DESC = (
+    "Export only a random subset of the strands in viewport render, so the first image appears faster. "
+    "The strands are made thicker to keep the approximate density of the hair"
+)
+
+VIEWPORT_LOD_STRANDS_DESC = "Percentage of strands that are exported when the viewport render starts"
+
+VIEWPORT_LOD_REFINE_DESC = (
+    "Export all strands when the viewport was not changed for a moment. "
+    "The full export of each hair system blocks the interface while it runs. "
+    "If disabled, the viewport always shows the reduced strand count"
+)
+
 
 class LuxCoreHair(PropertyGroup):
     """
@@ -119,6 +132,11 @@ class LuxCoreHair(PropertyGroup):
     instancing: EnumProperty(name="Optimization", default="disabled", items=INSTANCING_TYPES,
                               description="Note: Only affects CPU rendering")
 
+    use_viewport_lod: BoolProperty(name="Viewport Level of Detail", default=False, description=VIEWPORT_LOD_DESC)
+    viewport_lod_strands: FloatProperty(name="Initial Strands", default=10, min=0.1, max=100, precision=1,
+                                        subtype="PERCENTAGE", description=VIEWPORT_LOD_STRANDS_DESC)
+    viewport_lod_refine: BoolProperty(name="Refine When Idle", default=True, description=VIEWPORT_LOD_REFINE_DESC)
+
 
 class LuxCoreParticlesProps(PropertyGroup):
     hair: PointerProperty(type=LuxCoreHair)
@@ -128,6 +128,19 @@ def bool_to_string(value):
         return "Disabled"
 
 
+def memory_to_string(num_bytes):
+    return "%.1f MiB" % (num_bytes / (1024 * 1024))
+
+
+def percentage_to_string(fraction):
+    return "%.1f %%" % (fraction * 100)
+
+
+def hits_misses_to_string(hits_misses):
+    hits, misses = hits_misses
+    return "%d hits, %d misses" % (hits, misses)
+
+
 class Stat:
     id = 0
 
@@ -213,6 +226,17 @@ class LuxCoreRenderStats:
         self.cache_caustics = Stat("Caustics Cache", categories[-1], False, string_func=bool_to_string)
         self.cache_envlight = Stat("Env. Light Cache", categories[-1], False, string_func=bool_to_string)
         self.cache_dls = Stat("DLS Cache", categories[-1], False, string_func=bool_to_string)
+        self.material_cache = Stat("Material Export Cache", categories[-1], (0, 0), string_func=hits_misses_to_string)
+        self.hair_cache = Stat("Hair Shape Cache", categories[-1], (0, 0), string_func=hits_misses_to_string)
+        categories.append("Film Refresh")
+        self.film_refresh_time = Stat("Refresh Time", categories[-1],
+                                      0, smaller_is_better, time_to_string, get_rounded)
+        self.film_refresh_time_max = Stat("Max. Refresh Time", categories[-1],
+                                          0, smaller_is_better, time_to_string, get_rounded)
+        self.film_buffer_memory = Stat("Peak Buffer Memory", categories[-1],
+                                       0, smaller_is_better, memory_to_string)
+        self.refresh_overhead = Stat("Refresh Overhead", categories[-1],
+                                     0, smaller_is_better, percentage_to_string)
 
         self.members = [getattr(self, attr) for attr in dir(self)
                         if not callable(getattr(self, attr)) and not attr.startswith("__")]
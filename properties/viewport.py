@@ -50,16 +50,31 @@ class LuxCoreViewportSettings(bpy.types.PropertyGroup):
                                          "for quick feedback but can't handle complex light paths")
 
     use_denoiser: BoolProperty(name="Denoise", default=True,
-                           description="Denoise the viewport render once the halt time is reached. "
+                           description="Denoise the viewport render. "
                                        "Note that this disables most imagepipeline plugins in the viewport")
     denoisers = [
-        ("OIDN", "Intel Open Image Denoiser", "Denoising is only performed once the viewport render pauses", 0),
+        ("OIDN", "Intel Open Image Denoiser", "Denoises in the background at increasing sample counts while "
+                                              "rendering, and once more when the viewport render pauses", 0),
         ("OPTIX", "OptiX", "Denoises continuously during viewport rendering", 1),
     ]
     denoiser: EnumProperty(name="Denoiser", items=denoisers, default="OPTIX")
     min_samples: IntProperty(name="Min. Samples", default=1, min=0, 
                              description="Minimum amount of samples to be rendered before viewport denoiser is enabled")
 
+    use_texture_proxies: BoolProperty(name="Use Texture Proxies", default=True,
+                                      description="Use downscaled copies of image textures in the viewport render. "
+                                                  "They are built in the background on first use and cached on disk, "
+                                                  "until then a placeholder color is shown. "
+                                                  "Final renders always use the original images")
+    texture_proxy_sizes = [
+        ("512", "512", "", 0),
+        ("1024", "1024", "", 1),
+        ("2048", "2048", "", 2),
+        ("4096", "4096", "", 3),
+    ]
+    texture_proxy_size: EnumProperty(name="Proxy Size", items=texture_proxy_sizes, default="1024",
+                                     description="Maximum width and height of texture proxies in pixels")
+
     @staticmethod
     def can_use_optix_denoiser(context):
         preferences = utils.get_addon_preferences(context)
@@ -88,6 +88,12 @@ class LuxCoreAddonPreferences(AddonPreferences):
 
     display_luxcore_logs: BoolProperty(name="Show LuxCore Logs", default=True)
 
+    image_cache_size: IntProperty(
+        name="Image Cache Size (MB)", default=4096, min=0, soft_max=65536,
+        description="Packed and generated images are stored in a cache on disk for re-use in later sessions. "
+                    "Least recently used images are deleted when the cache grows larger than this size"
+    )
+
     # Read-only string property, returns the current date
     def get_pyluxcore_version(self):
         try:
@@ -127,6 +133,11 @@ class LuxCoreAddonPreferences(AddonPreferences):
         split.label(text="Image Nodes:")
         split.prop(self, "image_node_thumb_default")
 
+        row = layout.row()
+        split = row.split(factor=SPLIT_FACTOR)
+        split.label(text="Image Cache:")
+        split.prop(self, "image_cache_size")
+
         row = layout.row()
         row.label(text="Community:")
         op = row.operator("luxcore.open_website", text="Forums", icon=icons.URL)
@@ -44,7 +44,9 @@ class LUXCORE_IMAGE_PT_display(Panel, LuxCoreImagePanel):
 
         template_refresh_button(LuxCoreDisplaySettings.refresh, "luxcore.request_display_refresh",
                                 layout, "Refreshing film...")
-        layout.prop(display, "interval")
+        col = layout.column(align=True)
+        col.prop(display, "interval")
+        col.prop(display, "refresh_overhead")
 
         if config.engine == "PATH" and config.use_tiles:
             col = layout.column(align=True)
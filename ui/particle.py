@@ -176,6 +176,12 @@ class LUXCORE_HAIR_PT_hair(ParticleButtonsPanel, Panel):
 
         layout.prop(settings, "instancing")
 
+        layout.prop(settings, "use_viewport_lod")
+        col = layout.column(align=True)
+        col.active = settings.use_viewport_lod
+        col.prop(settings, "viewport_lod_strands")
+        col.prop(settings, "viewport_lod_refine")
+
 
 class LUXCORE_PARTICLE_PT_textures(ParticleButtonsPanel, Panel):
     bl_label = "Textures"
@@ -211,6 +211,11 @@ class LUXCORE_RENDER_PT_sampling_advanced(RenderButtonsPanel, Panel):
         row.active = not config.use_animated_seed
         row.prop(config, "seed")
         row.prop(config, "use_animated_seed", text="", icon="TIME", toggle=True)
+
+        col = layout.column()
+        col.prop(config, "use_persistent_animation_session")
+        if config.use_persistent_animation_session and config.use_animated_seed:
+            col.label(text="Animated seed requires a full export on each frame", icon=icons.INFO)
         
         # Light strategy
         col = layout.column()
@@ -38,6 +38,12 @@ class LUXCORE_RENDER_PT_viewport_settings(RenderButtonsPanel, Panel):
 
         if luxcore_engine == "BIDIR":
             layout.prop(viewport, "use_bidir")
+
+        col = layout.column(align=True)
+        col.prop(viewport, "use_texture_proxies")
+        sub = col.column(align=True)
+        sub.active = viewport.use_texture_proxies
+        sub.prop(viewport, "texture_proxy_size")
     
     def draw_header(self, context):
         layout = self.layout
@@ -73,9 +79,7 @@ class LUXCORE_RENDER_PT_viewport_settings_denoiser(RenderButtonsPanel, Panel):
         col = layout.column()
         col.active = can_use_optix
         col.prop(viewport, "denoiser")
-        
-        if viewport.get_denoiser(context) == "OPTIX":
-            col.prop(viewport, "min_samples")
+        layout.prop(viewport, "min_samples")
 
 
 
@@ -448,6 +448,44 @@ def has_deforming_modifiers(obj):
     return any([mod.type not in NON_DEFORMING_MODIFIERS for mod in obj.modifiers])
 
 
+ANIMATED_GEOMETRY_MODIFIERS = {
+    "NODES", "CLOTH", "SOFT_BODY", "FLUID", "OCEAN", "DYNAMIC_PAINT",
+    "MESH_CACHE", "MESH_SEQUENCE_CACHE", "EXPLODE", "WAVE", "SURFACE_DEFORM",
+}
+
+
+def has_animated_geometry(obj, scene):
+    """
+    Conservative check if the geometry of an object can change from frame to frame.
+    Deform modifiers (e.g. armatures) and shape keys are reported by Blender,
+    simulations and procedural modifiers are assumed to always be animated.
+    """
+    obj = obj.original
+
+    if obj.type == "META":
+        # Metaballs are influenced by other objects, we can't track this
+        return True
+    if obj.is_deform_modified(scene, "RENDER"):
+        return True
+    if any(mod.type in ANIMATED_GEOMETRY_MODIFIERS and mod.show_render for mod in obj.modifiers):
+        return True
+    if any(psys.use_hair_dynamics for psys in getattr(obj, "particle_systems", [])):
+        return True
+
+    for datablock in (obj, obj.data):
+        anim = getattr(datablock, "animation_data", None)
+        if anim is None:
+            continue
+        if anim.drivers:
+            return True
+        if datablock is obj.data and anim.action:
+            return True
+        if anim.action and any(fcurve.data_path.startswith("modifiers[")
+                               for fcurve in getattr(anim.action, "fcurves", [])):
+            return True
+    return False
+
+
 def can_share_mesh(obj):
     if not obj.data or obj.data.users < 2:
         return False
@@ -575,6 +613,43 @@ def is_cuda_build():
     return pyluxcore.GetPlatformDesc().Get("compile.LUXRAYS_ENABLE_CUDA").GetBool()
 
 
+class SequenceIndex:
+    """
+    This class is a singleton.
+    Caches the directory scans that are needed to resolve image and OpenVDB sequences.
+    Each directory is scanned once, and again only when its modification time changes
+    or refresh() is called. The resolved sequences are cached per directory as well.
+    """
+    # {basedir: (mtime, [(filename, filepath)], {sequence_key: indexed_filepaths})}
+    directories = {}
+
+    @classmethod
+    def get(cls, basedir, sequence_key, parse_func):
+        """
+        Returns the cached result of parse_func(files) for the files in basedir,
+        where files is a list of (filename, filepath) tuples
+        """
+        mtime = os.stat(basedir).st_mtime_ns
+        entry = cls.directories.get(basedir)
+
+        if entry is None or entry[0] != mtime:
+            files = [(f.name, f.path) for f in os.scandir(basedir) if f.is_file()]
+            entry = (mtime, files, {})
+            cls.directories[basedir] = entry
+
+        _, files, sequences = entry
+        try:
+            return sequences[sequence_key]
+        except KeyError:
+            indexed_filepaths = parse_func(files)
+            sequences[sequence_key] = indexed_filepaths
+            return indexed_filepaths
+
+    @classmethod
+    def refresh(cls):
+        cls.directories.clear()
+
+
 def image_sequence_resolve_all(image):
     """
     From https://blender.stackexchange.com/a/21093/29401
@@ -594,18 +669,20 @@ def image_sequence_resolve_all(image):
         # Input isn't from a sequence
         return []
 
-    indexed_filepaths = []
-    for f in os.scandir(basedir):
-        index_str = f.name[len(filename_nodigits):-len(ext) if ext else -1]
+    def parse(files):
+        indexed_filepaths = []
+        for name, path in files:
+            index_str = name[len(filename_nodigits):-len(ext) if ext else -1]
+
+            if (name.startswith(filename_nodigits)
+                    and name.endswith(ext)
+                    and index_str.isdigit()):
+                elem = (int(index_str), path)
+                indexed_filepaths.append(elem)
 
-        if (f.is_file()
-                and f.name.startswith(filename_nodigits)
-                and f.name.endswith(ext)
-                and index_str.isdigit()):
-            elem = (int(index_str), f.path)
-            indexed_filepaths.append(elem)
+        return sorted(indexed_filepaths, key=lambda elem: elem[0])
 
-    return sorted(indexed_filepaths, key=lambda elem: elem[0])
+    return SequenceIndex.get(basedir, ("image", filename_nodigits, ext), parse)
 
 def openVDB_sequence_resolve_all(file):
     filepath = get_abspath(file)
@@ -630,16 +707,19 @@ def openVDB_sequence_resolve_all(file):
         # Input isn't from a sequence
         return []
 
-    indexed_filepaths = []
-    for f in os.scandir(basedir):
-        filename_noext2, ext2 = os.path.splitext(f.name)
-        if ext == ext2:
-            matchObj = re.match(matchstr, filename_noext2)
-            if matchObj and name == matchObj.group(1):
-                elem = (int(matchObj.group(2)), f.path)
-                indexed_filepaths.append(elem)
+    def parse(files):
+        indexed_filepaths = []
+        for filename2, path in files:
+            filename_noext2, ext2 = os.path.splitext(filename2)
+            if ext == ext2:
+                matchObj = re.match(matchstr, filename_noext2)
+                if matchObj and name == matchObj.group(1):
+                    elem = (int(matchObj.group(2)), path)
+                    indexed_filepaths.append(elem)
+
+        return sorted(indexed_filepaths, key=lambda elem: elem[0])
 
-    return sorted(indexed_filepaths, key=lambda elem: elem[0])
+    return SequenceIndex.get(basedir, ("openvdb", matchstr, name, ext), parse)
 
 
 def is_valid_camera(obj):
@@ -39,6 +39,11 @@ class LuxCoreErrorLog:
     def add_warning(cls, message, obj_name=""):
         cls._add("WARNING:", cls.warnings, message, obj_name)
 
+    @classmethod
+    def get_count(cls):
+        """ Number of reported errors and warnings, including repetitions """
+        return sum(elem.count for elem in cls.errors + cls.warnings)
+
     @classmethod
     def clear(cls, force_ui_update=True):
         cls.errors.clear()
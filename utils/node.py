@@ -1,3 +1,4 @@
+import hashlib
 import bpy
 import mathutils
 import pyluxcore
@@ -216,6 +217,208 @@ def has_nodes_multi(node_tree, bl_idname_set, follow_pointers):
     return False
 
 
+class NodeTreeFeatures:
+    """
+    Summary of the node types in a node tree (including the trees of pointer nodes)
+    that require special handling during object export
+    """
+    __slots__ = ("pointiness", "random_per_island_float", "random_per_island_int", "edge_detector",
+                 "displacement", "image_sequence", "openvdb", "time_info")
+
+    def __init__(self):
+        for attr in self.__slots__:
+            setattr(self, attr, False)
+
+    def merge(self, other):
+        for attr in self.__slots__:
+            if getattr(other, attr):
+                setattr(self, attr, True)
+
+
+def get_node_tree_features(node_tree, cache=None):
+    """
+    Computes the NodeTreeFeatures of a node tree in a single traversal.
+    If cache (a dict) is passed, the results of all visited trees are stored in it.
+    """
+    if cache is None:
+        cache = {}
+    return _get_node_tree_features(node_tree, cache, set())
+
+
+def _get_node_tree_features(node_tree, cache, stack):
+    key = node_tree.as_pointer()
+    try:
+        return cache[key]
+    except KeyError:
+        pass
+
+    stack.add(key)
+    features = NodeTreeFeatures()
+
+    for node in node_tree.nodes:
+        bl_idname = node.bl_idname
+
+        if bl_idname == "LuxCoreNodeTreePointer" and node.node_tree:
+            if node.node_tree.as_pointer() in stack:
+                msg = (f'Pointer nodes in node trees "{node_tree.name}" and "{node.node_tree.name}" '
+                       "create a dependency cycle! Delete one of them.")
+                LuxCoreErrorLog.add_error(msg)
+                # Mark the faulty nodes in red
+                node.use_custom_color = True
+                node.color = (0.9, 0, 0)
+                continue
+            features.merge(_get_node_tree_features(node.node_tree, cache, stack))
+        elif bl_idname == "LuxCoreNodeTexPointiness":
+            features.pointiness = True
+        elif bl_idname == "LuxCoreNodeTexRandomPerIsland":
+            features.random_per_island_float = True
+        elif bl_idname in {"LuxCoreNodeTexMapping2D", "LuxCoreNodeTexMapping3D"}:
+            if node.mapping_type in {"uvrandommapping2d", "localrandommapping3d"} and node.seed_type == "mesh_islands":
+                features.random_per_island_int = True
+        elif bl_idname == "LuxCoreNodeTexWireframe":
+            if node.hide_planar_edges:
+                features.edge_detector = True
+        elif bl_idname in {"LuxCoreNodeShapeHeightDisplacement", "LuxCoreNodeShapeVectorDisplacement"}:
+            features.displacement = True
+        elif bl_idname == "LuxCoreNodeTexImagemap":
+            if node.image and node.image.source == "SEQUENCE":
+                features.image_sequence = True
+        elif bl_idname == "LuxCoreNodeTexOpenVDB":
+            features.openvdb = True
+        elif bl_idname == "LuxCoreNodeTexTimeInfo":
+            features.time_info = True
+
+    stack.discard(key)
+    cache[key] = features
+    return features
+
+
+# The built-in properties of nodes and sockets only affect the appearance in the node editor,
+# or they are covered elsewhere (names, links), so node_tree_fingerprint() ignores them.
+# They are identified by their RNA pointer: a node class that defines its own property with
+# the same identifier (e.g. the "width" of the wireframe texture) is still fingerprinted.
+FINGERPRINT_IGNORED_PROPS = {
+    prop.as_pointer()
+    for base in (bpy.types.Node, bpy.types.NodeSocket)
+    for prop in base.bl_rna.properties
+}
+# Nodes whose export depends on the current frame
+TIME_DEPENDENT_NODES = {
+    "LuxCoreNodeTexImagemap", "LuxCoreNodeTexOpenVDB", "LuxCoreNodeTexTimeInfo", "LuxCoreNodeTexSmoke",
+}
+
+
+def node_tree_fingerprint(node_tree, scene):
+    """
+    Returns a content hash of a LuxCore node tree: node types, property values,
+    socket values, links, the trees of pointer nodes and the identity of referenced images.
+    Node memory addresses are part of the hash because they are used as LuxCore names
+    of the exported textures.
+    The second return value tells if the export of the tree depends on the current frame.
+    """
+    hasher = hashlib.md5()
+    is_time_dependent = _fingerprint_node_tree(node_tree, scene, hasher, set())
+    return hasher.hexdigest(), is_time_dependent
+
+
+def get_node_tree_fingerprint(exporter, node_tree):
+    """
+    Like node_tree_fingerprint(), but memoized for the duration
+    of one export or update in exporter.node_tree_fingerprints
+    """
+    key = node_tree.as_pointer()
+    try:
+        return exporter.node_tree_fingerprints[key]
+    except KeyError:
+        result = node_tree_fingerprint(node_tree, exporter.scene)
+        exporter.node_tree_fingerprints[key] = result
+        return result
+
+
+def _fingerprint_node_tree(node_tree, scene, hasher, visited):
+    key = node_tree.as_pointer()
+    if key in visited:
+        # Dependency cycle, the export will report it
+        hasher.update(b"cycle")
+        return False
+    visited.add(key)
+
+    is_time_dependent = False
+    hasher.update(f"tree{key}".encode())
+
+    for node in node_tree.nodes:
+        hasher.update(f"node{node.as_pointer()}{node.bl_idname}{node.name}".encode())
+        is_time_dependent |= _fingerprint_struct(node, scene, hasher, visited)
+
+        for socket in node.inputs:
+            hasher.update(f"in{socket.identifier}{socket.name}{socket.enabled}".encode())
+            _fingerprint_struct(socket, scene, hasher, visited)
+
+        if node.bl_idname in TIME_DEPENDENT_NODES:
+            is_time_dependent = True
+            hasher.update(f"frame{scene.frame_current}{scene.render.fps}{scene.render.fps_base}".encode())
+
+    for link in node_tree.links:
+        hasher.update(f"link{link.from_node.name}{link.from_socket.identifier}"
+                      f"{link.to_node.name}{link.to_socket.identifier}{link.is_muted}".encode())
+
+    visited.discard(key)
+    return is_time_dependent
+
+
+def update_hash_from_struct(hasher, struct, scene):
+    """
+    Adds the property values of a bpy_struct (e.g. particle settings) to a hashlib object,
+    following pointers like node_tree_fingerprint() does
+    """
+    _fingerprint_struct(struct, scene, hasher, set())
+
+
+def _fingerprint_struct(struct, scene, hasher, visited):
+    is_time_dependent = False
+
+    for prop in struct.bl_rna.properties:
+        identifier = prop.identifier
+        if identifier.startswith("bl_") or prop.as_pointer() in FINGERPRINT_IGNORED_PROPS:
+            continue
+
+        if prop.type == "POINTER":
+            value = getattr(struct, identifier)
+            if value is None:
+                hasher.update(f"{identifier}None".encode())
+            elif isinstance(value, bpy.types.NodeTree):
+                is_time_dependent |= _fingerprint_node_tree(value, scene, hasher, visited)
+            elif isinstance(value, bpy.types.Image):
+                hasher.update(f"{identifier}{_image_identity(value)}".encode())
+            elif isinstance(value, bpy.types.Object):
+                matrix = tuple(tuple(row) for row in value.matrix_world)
+                hasher.update(f"{identifier}{value.name_full}{matrix}".encode())
+            elif isinstance(value, bpy.types.ID):
+                hasher.update(f"{identifier}{value.name_full}".encode())
+            elif isinstance(value, bpy.types.PropertyGroup):
+                is_time_dependent |= _fingerprint_struct(value, scene, hasher, visited)
+        elif prop.type == "COLLECTION":
+            if prop.is_readonly:
+                continue
+            for item in getattr(struct, identifier):
+                if isinstance(item, bpy.types.PropertyGroup):
+                    is_time_dependent |= _fingerprint_struct(item, scene, hasher, visited)
+        elif not prop.is_readonly:
+            value = getattr(struct, identifier)
+            if getattr(prop, "is_array", False):
+                value = tuple(value)
+            hasher.update(f"{identifier}{value!r}".encode())
+
+    return is_time_dependent
+
+
+def _image_identity(image):
+    packed_size = image.packed_file.size if image.packed_file else 0
+    return (image.name_full, image.filepath_raw, image.source, packed_size, image.is_dirty,
+            image.generated_type, tuple(image.generated_color), image.generated_width,
+            image.generated_height, image.colorspace_settings.name, image.alpha_mode)
+
+
 def force_viewport_update(_, context):
     """
     Since Blender 2.80, properties on custom sockets and custom nodes are not listed
@@ -1,77 +1,234 @@
 import numpy as np
-import re
+import os
 import sys
 
-# Functions for loading/saving portable floatmap files from
+# Functions for loading/saving portable floatmap files, originally based on
 # https://gist.github.com/chpatrick/8935738
+#
+# Note that PFM stores the rows from bottom to top. Like LuxCore film outputs, the arrays
+# returned by these functions keep this row order, no flipping is done.
+#
+# PFM has no alpha channel. Images with 4 channels are stored as an RGB file and
+# a greyscale sidecar file next to it (see alpha_sidecar_path()).
+
+# Maximum length of the header we accept, the real header is usually around 20 bytes
+MAX_HEADER_SIZE = 256
+# Number of rows that are converted at once when an image has to be converted during save
+ROWS_PER_CHUNK = 256
+
+
+class PFMHeader:
+    def __init__(self, channels, width, height, scale, byteorder, data_offset):
+        self.channels = channels
+        self.width = width
+        self.height = height
+        self.scale = scale
+        # "<" (little endian) or ">" (big endian)
+        self.byteorder = byteorder
+        # Position of the first pixel in the file
+        self.data_offset = data_offset
+
+    @property
+    def dtype(self):
+        return np.dtype(self.byteorder + "f4")
+
+    @property
+    def shape(self):
+        return (self.height, self.width, self.channels)
+
+
+def read_header(file):
+    """
+    Parse the header of a PFM file opened in binary mode.
+    Tokens may be separated by any whitespace (spaces, tabs, newlines), the header
+    ends with the single whitespace character after the scale token.
+    The file position is left at the start of the pixel data.
+    """
+    start = file.tell()
+    raw = file.read(MAX_HEADER_SIZE)
+    tokens = []
+    pos = 0
+
+    while len(tokens) < 4:
+        # Skip whitespace and comments between tokens
+        while pos < len(raw) and (raw[pos:pos + 1].isspace() or raw[pos:pos + 1] == b"#"):
+            if raw[pos:pos + 1] == b"#":
+                end = raw.find(b"\n", pos)
+                pos = len(raw) if end == -1 else end
+            pos += 1
+
+        token_start = pos
+        while pos < len(raw) and not raw[pos:pos + 1].isspace():
+            pos += 1
+
+        if pos == token_start or pos >= len(raw):
+            raise Exception("Malformed PFM header.")
+        tokens.append(raw[token_start:pos].decode("ascii", errors="replace"))
+
+    # Exactly one whitespace character separates the header from the data
+    data_offset = start + pos + 1
+
+    identifier, width, height, scale = tokens
+    if identifier == "PF":
+        channels = 3
+    elif identifier == "Pf":
+        channels = 1
+    else:
+        raise Exception("Not a PFM file.")
 
+    try:
+        width = int(width)
+        height = int(height)
+        scale = float(scale)
+    except ValueError:
+        raise Exception("Malformed PFM header.")
 
-def load_pfm(file, as_flat_list=False):
+    if width <= 0 or height <= 0 or scale == 0:
+        raise Exception("Malformed PFM header.")
+
+    # A negative scale means little endian
+    byteorder = "<" if scale < 0 else ">"
+    file.seek(data_offset)
+    return PFMHeader(channels, width, height, abs(scale), byteorder, data_offset)
+
+
+def _write_header(file, channels, width, height, scale, byteorder):
+    if byteorder == "<" or byteorder == "=" and sys.byteorder == "little":
+        scale = -scale
+    file.write(b"PF\n" if channels == 3 else b"Pf\n")
+    file.write(b"%d %d\n" % (width, height))
+    file.write(b"%f\n" % scale)
+
+
+def alpha_sidecar_path(filepath):
+    base, extension = os.path.splitext(filepath)
+    return base + "_alpha" + extension
+
+
+def open_pfm(filepath, mode="r"):
+    """
+    Map a PFM file into memory without reading it. Returns a tuple containing
+    a numpy.memmap of shape H x W x C and the scale factor from the file.
+    Pixels are only read from disk when they are accessed.
+    Use mode="r+" to modify the file in place.
+    Note: the file can't be deleted on Windows while the memmap is alive.
+    """
+    with open(filepath, "rb") as f:
+        header = read_header(f)
+
+    data = np.memmap(filepath, dtype=header.dtype, mode=mode,
+                     offset=header.data_offset, shape=header.shape)
+    return data, header.scale
+
+
+def read_rows(filepath, start, stop):
+    """
+    Read the rows [start, stop) of a PFM file (counted from the bottom, like the file order)
+    as H x W x C float32 array, without reading the rest of the file.
+    """
+    data, _ = open_pfm(filepath)
+    try:
+        return np.array(data[start:stop], dtype=np.float32)
+    finally:
+        del data
+
+
+def create_pfm(filepath, width, height, channels=3, scale=1):
+    """
+    Create a PFM file of the given size and return a writable numpy.memmap of
+    shape H x W x C, so an image (e.g. a film output) can be written straight
+    into the file without an intermediate copy in memory. Call flush() on the
+    returned array (or delete it) when done.
+    """
+    if channels not in {1, 3}:
+        raise Exception("PFM files can only have 1 or 3 channels (got %d)" % channels)
+
+    with open(filepath, "wb") as f:
+        _write_header(f, channels, width, height, scale, "<")
+        data_offset = f.tell()
+        # Preallocate the pixel data
+        f.truncate(data_offset + width * height * channels * 4)
+
+    return np.memmap(filepath, dtype="<f4", mode="r+", offset=data_offset, shape=(height, width, channels))
+
+
+def load_pfm(file, as_flat_list=False, with_alpha=False):
     """
     Load a PFM file into a Numpy array. Note that it will have
     a shape of H x W, not W x H. Returns a tuple containing the
     loaded image and the scale factor from the file.
+    If with_alpha is True, the alpha sidecar file is loaded as 4th channel.
 
     Usage:
     with open(r"path/to/file.pfm", "rb") as f:
         data, scale = load_pfm(f)
     """
-    header = file.readline().decode("utf-8").rstrip()
-    if header == "PF":
-        color = True
-    elif header == "Pf":
-        color = False
-    else:
-        raise Exception("Not a PFM file.")
-
-    dim_match = re.match(r"^(\d+)\s(\d+)\s$", file.readline().decode("utf-8"))
-    if dim_match:
-        width, height = map(int, dim_match.groups())
-    else:
-        raise Exception("Malformed PFM header.")
-
-    scale = float(file.readline().decode("utf-8").rstrip())
-    if scale < 0:  # little-endian
-        endian = "<"
-        scale = -scale
+    header = read_header(file)
+    count = header.width * header.height * header.channels
+
+    if with_alpha:
+        # The RGB and alpha data are read directly into the final interleaved array
+        data = np.empty((header.height, header.width, 4), dtype=np.float32)
+        data[..., :3] = np.fromfile(file, header.dtype, count).reshape(header.shape)
+        with open(alpha_sidecar_path(file.name), "rb") as alpha_file:
+            alpha_header = read_header(alpha_file)
+            if (alpha_header.width, alpha_header.height) != (header.width, header.height):
+                raise Exception("Size of alpha sidecar file does not match the PFM file.")
+            alpha_count = alpha_header.width * alpha_header.height
+            data[..., 3] = np.fromfile(alpha_file, alpha_header.dtype, alpha_count).reshape(header.height,
+                                                                                            header.width)
     else:
-        endian = ">"  # big-endian
+        data = np.fromfile(file, header.dtype, count)
+        if len(data) != count:
+            raise Exception("PFM file is truncated.")
+        data = data.reshape(header.shape if header.channels == 3 else header.shape[:2])
 
-    data = np.fromfile(file, endian + "f")
-    shape = (height, width, 3) if color else (height, width)
     if as_flat_list:
-        result = data
-    else:
-        result = np.reshape(data, shape)
-    return result, scale
+        data = data.reshape(-1)
+    return data, header.scale
 
 
 def save_pfm(file, image, scale=1):
     """
     Save a Numpy array to a PFM file.
+    Float32 arrays are written without a copy, other dtypes are converted
+    in chunks of rows. For H x W x 4 images, the alpha channel is saved
+    to a sidecar file (only possible if file has a name).
 
     Usage:
     with open(r"/path/to/out.pfm", "wb") as f:
         save_pfm(f, data)
     """
-    if image.dtype.name != "float32":
-        raise Exception("Image dtype must be float32 (got %s)" % image.dtype.name)
+    if image.dtype.kind != "f":
+        raise Exception("Image dtype must be a float type (got %s)" % image.dtype.name)
 
-    if len(image.shape) == 3 and image.shape[2] == 3:  # color image
-        color = True
+    if len(image.shape) == 3 and image.shape[2] in {3, 4}:  # color image
+        channels = 3
     elif len(image.shape) == 2 or len(image.shape) == 3 and image.shape[2] == 1:  # greyscale
-        color = False
+        channels = 1
     else:
-        raise Exception("Image must have H x W x 3, H x W x 1 or H x W dimensions.")
+        raise Exception("Image must have H x W x 4, H x W x 3, H x W x 1 or H x W dimensions.")
 
-    file.write(b"PF\n" if color else b"Pf\n")
-    file.write(b"%d %d\n" % (image.shape[1], image.shape[0]))
+    height, width = image.shape[:2]
+    is_rgba = len(image.shape) == 3 and image.shape[2] == 4
+    color = image[..., :3] if is_rgba else image
 
-    endian = image.dtype.byteorder
+    if image.dtype == np.float32 and not is_rgba:
+        _write_header(file, channels, width, height, scale, image.dtype.byteorder)
+        # No copy if the array is contiguous
+        file.write(np.ascontiguousarray(color).data)
+    else:
+        _write_header(file, channels, width, height, scale, "<")
+        _write_rows_converted(file, color)
 
-    if endian == "<" or endian == "=" and sys.byteorder == "little":
-        scale = -scale
+    if is_rgba:
+        with open(alpha_sidecar_path(file.name), "wb") as alpha_file:
+            _write_header(alpha_file, 1, width, height, scale, "<")
+            _write_rows_converted(alpha_file, image[..., 3])
 
-    file.write(b"%f\n" % scale)
 
-    image.tofile(file)
+def _write_rows_converted(file, image):
+    # Convert to little endian float32 in chunks to avoid a full copy of the image
+    for start in range(0, image.shape[0], ROWS_PER_CHUNK):
+        chunk = np.ascontiguousarray(image[start:start + ROWS_PER_CHUNK], dtype="<f4")
+        file.write(chunk.data)
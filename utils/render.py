@@ -1,5 +1,4 @@
 import math
-from . import calc_filmsize
 from .. import utils
 from ..handlers.draw_imageeditor import TileStats
 from ..properties.statistics import (
@@ -237,12 +236,81 @@ def get_pretty_stats(config, stats, scene, context=None):
     return " | ".join(pretty)
 
 
-def shortest_display_interval(scene):
-    # Magic formula to compute shortest possible display interval (found through testing).
-    # If the interval is any shorter, the CPU won't be able to keep up.
-    # Only used for final renders.
-    width, height = calc_filmsize(scene)
-    return (width * height) / 852272.0 * 1.1
+class RefreshScheduler:
+    """
+    Decides when a final render updates its stats and film. Instead of fixed intervals,
+    the measured cost of each operation is used, so the time spent on it stays below
+    a fraction of the wall time (cheap refreshes of small images happen often,
+    expensive refreshes of huge images rarely).
+    Only used for final renders.
+    """
+    # Polling interval of the render loop, determines how fast we react to user events
+    POLL_INTERVAL = 0.2
+    # Stats are needed to check halt conditions, so they are never updated less often than this
+    MIN_STAT_INTERVAL = 0.2
+    MAX_STAT_INTERVAL = 16
+    # Weight of the newest measurement in the moving average of the costs
+    COST_SMOOTHING = 0.5
+
+    def __init__(self, start, overhead_fraction, film_interval, fast_refresh_duration):
+        self.start = start
+        self.overhead_fraction = overhead_fraction
+        # User-defined time between film refreshes after the fast refresh phase
+        self.film_interval = film_interval
+        self.fast_refresh_duration = fast_refresh_duration
+        self.stat_cost = 0
+        self.film_cost = 0
+        self.last_stat_refresh = 0
+        self.last_film_refresh = 0
+        self.total_cost = 0
+
+    def _budget_interval(self, cost):
+        # The interval at which the operation uses exactly the allowed fraction of wall time
+        return cost / self.overhead_fraction
+
+    def _update_cost(self, old_cost, duration):
+        if old_cost == 0:
+            return duration
+        return old_cost + (duration - old_cost) * self.COST_SMOOTHING
+
+    def stat_interval(self):
+        return min(max(self._budget_interval(self.stat_cost), self.MIN_STAT_INTERVAL), self.MAX_STAT_INTERVAL)
+
+    def film_interval_at(self, now):
+        budget_interval = self._budget_interval(self.film_cost)
+        if now - self.start < self.fast_refresh_duration:
+            # Show the first samples as fast as the budget allows
+            return max(budget_interval, self.POLL_INTERVAL)
+        return max(budget_interval, self.film_interval)
+
+    def is_stat_refresh_due(self, now):
+        return now - self.last_stat_refresh >= self.stat_interval()
+
+    def time_until_film_refresh(self, now):
+        return self.film_interval_at(now) - (now - self.last_film_refresh)
+
+    def time_until_next_event(self, now):
+        time_until_stat_refresh = self.stat_interval() - (now - self.last_stat_refresh)
+        return min(time_until_stat_refresh, self.time_until_film_refresh(now))
+
+    def sleep_duration(self, now):
+        # Sleep until the next refresh is due, but wake up regularly to check for user events
+        return min(max(self.time_until_next_event(now), 0.01), self.POLL_INTERVAL)
+
+    def stats_refreshed(self, now, duration):
+        self.last_stat_refresh = now
+        self.stat_cost = self._update_cost(self.stat_cost, duration)
+        self.total_cost += duration
+
+    def film_refreshed(self, now, duration):
+        self.last_film_refresh = now
+        self.film_cost = self._update_cost(self.film_cost, duration)
+        self.total_cost += duration
+
+    def get_overhead(self, now):
+        """ Fraction of the wall time that was spent on refreshes so far """
+        elapsed = now - self.start
+        return self.total_cost / elapsed if elapsed > 0 else 0
 
 
 def find_suggested_clamp_value(session, scene=None):